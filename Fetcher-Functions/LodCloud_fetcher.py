@@ -1,11 +1,92 @@
 import requests
-import csv
-import time
+import codecs
+import json
 import os
 import re
+from http_client import HttpClient
+from http_cache import ResponseCache
+from term_matcher import TermMatcher
+from harvest_metrics import METRICS
+from record_sinks import BibtexSink, CsvSink, TeeSink
+from columnar_store import DEFAULT_ROOT as PARQUET_ROOT, parquet_sinks
+from corpus_store import DEFAULT_PATH as STORE_PATH, CorpusStore, store_sinks
 
 BASE_CATALOG_URL = "https://lod-cloud.net/versions/2025-12-19/lod-data.json"
 BASE_PAGE_URL = "https://lod-cloud.net/dataset/"
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_object(chunks):
+    """
+    Parser incrementale di un oggetto JSON di primo livello:
+    restituisce le coppie (chiave, valore) man mano che i byte arrivano,
+    senza tenere in memoria l'intero documento.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    eof = False
+
+    def more():
+        nonlocal buf, pos, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buf = buf[pos:] + utf8.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + utf8.decode(chunk)
+        pos = 0
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            more()
+
+    def expect(char):
+        nonlocal pos
+        skip_ws()
+        if pos >= len(buf) or buf[pos] != char:
+            raise ValueError(f"JSON catalog: atteso '{char}'")
+        pos += 1
+
+    def value():
+        nonlocal pos
+        while True:
+            skip_ws()
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more()
+                continue
+            # un numero a fine buffer potrebbe continuare nel chunk successivo
+            if end == len(buf) and not eof:
+                more()
+                continue
+            pos = end
+            return obj
+
+    expect("{")
+    skip_ws()
+    if buf[pos:pos + 1] == "}":
+        return
+    while True:
+        key = value()
+        expect(":")
+        yield key, value()
+        skip_ws()
+        if buf[pos:pos + 1] == ",":
+            pos += 1
+            continue
+        expect("}")
+        return
 
 
 class LodCloudFetcher:
@@ -20,27 +101,57 @@ class LodCloudFetcher:
     - Export CSV + BibTeX
     """
 
-    def __init__(self, max_retries=3, delay=2):
+    def __init__(self, max_retries=3, delay=2, client=None, cache=None):
         self.catalog = {}
+        self.matchers = {}
         self.max_retries = max_retries
         self.delay = delay
+        self.http = client or HttpClient(max_retries=max_retries, backoff_base=delay, cache=cache,
+                                         source="lodcloud")
 
     # ================= CATALOG =================
     def fetch_catalog(self):
         if self.catalog:
             return
         print("[INFO] Download LOD Cloud catalog...")
-        for attempt in range(self.max_retries):
-            try:
-                r = requests.get(BASE_CATALOG_URL, timeout=30)
-                r.raise_for_status()
-                self.catalog = r.json()
-                print(f"[INFO] Catalog loaded: {len(self.catalog)} datasets")
+        try:
+            r = self.http.get(BASE_CATALOG_URL)
+            r.raise_for_status()
+            self.catalog = r.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise RuntimeError(f"LOD Cloud catalog download failed: {e}") from e
+        print(f"[INFO] Catalog loaded: {len(self.catalog)} datasets")
+
+    def iter_catalog_chunks(self):
+        """Byte del catalogo: dalla cache su disco se valida, altrimenti in streaming dalla rete."""
+        cache = self.http.cache
+        headers = None
+        cached = cache.lookup(BASE_CATALOG_URL) if cache else None
+        if cached:
+            meta, body_path = cached
+            if cache.is_fresh(BASE_CATALOG_URL, meta):
+                yield from cache.iter_body(body_path, CHUNK_SIZE)
                 return
-            except Exception as e:
-                print(f"[WARN] Error: {e} – retry in {self.delay}s")
-                time.sleep(self.delay)
-        raise RuntimeError("LOD Cloud catalog download failed")
+            headers = cache.conditional_headers(meta)
+
+        r = self.http.get(BASE_CATALOG_URL, headers=headers, stream=True)
+        if cached and r.status_code == 304:
+            cache.touch(BASE_CATALOG_URL, None, meta)
+            yield from cache.iter_body(body_path, CHUNK_SIZE)
+            return
+        r.raise_for_status()
+        chunks = r.iter_content(CHUNK_SIZE)
+        if cache:
+            chunks = cache.store_stream(BASE_CATALOG_URL, None, r, chunks)
+        yield from chunks
+
+    def iter_catalog(self):
+        """(dataset_id, entry) man mano che il catalogo viene scaricato e letto."""
+        print("[INFO] Streaming LOD Cloud catalog...")
+        try:
+            yield from iter_json_object(self.iter_catalog_chunks())
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise RuntimeError(f"LOD Cloud catalog download failed: {e}") from e
 
     # ================= UTILS =================
     def _normalize_text(self, value, lang="en"):
@@ -59,15 +170,15 @@ class LodCloudFetcher:
             )
         return ""
 
-    def _match_term(self, term, text):
-        term = term.lower()
-        if term.endswith("*"):
-            prefix = term[:-1]
-            return any(w.startswith(prefix) for w in re.findall(r"\w+", text))
-        return term in text
-
-    def _match_any(self, terms, text):
-        return any(self._match_term(t, text) for t in terms)
+    def _matcher(self, cloud_terms, semantic_terms, exclude_terms):
+        # compilato una volta per combinazione di liste di termini
+        key = (tuple(cloud_terms), tuple(semantic_terms), tuple(exclude_terms))
+        if key not in self.matchers:
+            self.matchers[key] = TermMatcher(
+                all_of=[cloud_terms, semantic_terms],
+                none_of=exclude_terms,
+            )
+        return self.matchers[key]
 
     # ================= FILTER =================
     def filter_dataset(
@@ -86,16 +197,8 @@ class LodCloudFetcher:
 
         text = " ".join([title, desc, tags]).lower()
 
-        # AND group 1: cloud
-        if not self._match_any(cloud_terms, text):
-            return False
-
-        # AND group 2: semantic
-        if not self._match_any(semantic_terms, text):
-            return False
-
-        # NOT group
-        if self._match_any(exclude_terms, text):
+        # (cloud) AND (semantic) AND NOT (exclude), in una sola passata
+        if not self._matcher(cloud_terms, semantic_terms, exclude_terms).matches(text):
             return False
 
         # Year filter (issued)
@@ -119,11 +222,20 @@ class LodCloudFetcher:
         exclude_terms,
         year_min=2014,
         year_max=2025,
+        streaming=False,
     ):
-        self.fetch_catalog()
+        """
+        streaming=True: il catalogo viene letto e filtrato mentre arriva
+        (memoria costante, solo i dataset che passano il filtro restano in memoria).
+        """
+        if streaming:
+            entries = self.iter_catalog()
+        else:
+            self.fetch_catalog()
+            entries = self.catalog.items()
         results = []
 
-        for dataset_id, entry in self.catalog.items():
+        for dataset_id, entry in entries:
             dataset = {
                 "id": dataset_id,
                 "title": entry.get("title", ""),
@@ -148,73 +260,83 @@ class LodCloudFetcher:
         for d in results:
             unique[d["url"]] = d
 
+        METRICS.add_records("lodcloud", len(unique), duplicates=len(results) - len(unique))
         print(f"[INFO] Filtered unique datasets: {len(unique)}")
         return list(unique.values())
 
     # ================= SAVE CSV =================
+    def csv_row(self, d):
+        return {
+            "title": self._normalize_text(d["title"]),
+            "description": self._normalize_text(d["description"]),
+            "tags": self._normalize_text(d["tags"]),
+            "created": d["created"],
+            "url": d["url"],
+        }
+
+    def csv_sink(self, path):
+        return CsvSink(path, fieldnames=["title", "description", "tags", "created", "url"],
+                       row=self.csv_row)
+
     def save_csv(self, datasets, path):
-        if not datasets:
+        with self.csv_sink(path) as sink:
+            sink.write_all(datasets)
+        if sink.count:
+            print(f"[INFO] CSV saved: {path}")
+        else:
             print("[WARN] No datasets to save (CSV).")
-            return
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", newline="", encoding="utf-8-sig") as f:
-            writer = csv.DictWriter(
-                f,
-                fieldnames=["title", "description", "tags", "created", "url"],
-            )
-            writer.writeheader()
-            for d in datasets:
-                writer.writerow({
-                    "title": self._normalize_text(d["title"]),
-                    "description": self._normalize_text(d["description"]),
-                    "tags": self._normalize_text(d["tags"]),
-                    "created": d["created"],
-                    "url": d["url"],
-                })
-        print(f"[INFO] CSV saved: {path}")
 
     # ================= SAVE BIBTEX =================
-    def save_bibtex(self, datasets, path):
-        if not datasets:
-            print("[WARN] No datasets to save (BibTeX).")
-            return
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-
+    def bibtex_entry(self, d, i):
         def esc(s):
             if not s:
                 return ""
             return re.sub(r"([&_#%{}])", r"\\\1", s)
 
-        with open(path, "w", encoding="utf-8") as f:
-            for i, d in enumerate(datasets, 1):
-                title = esc(self._normalize_text(d["title"]))
-                year = d["created"] or ""
-                url = d["url"]
-                desc = esc(self._normalize_text(d["description"]))
-                tags = esc(self._normalize_text(d["tags"]))
-
-                note = " -- ".join(
-                    part for part in [desc, f"Tags: {tags}" if tags else ""]
-                    if part
-                )
+        title = esc(self._normalize_text(d["title"]))
+        year = d["created"] or ""
+        url = d["url"]
+        desc = esc(self._normalize_text(d["description"]))
+        tags = esc(self._normalize_text(d["tags"]))
+
+        note = " -- ".join(
+            part for part in [desc, f"Tags: {tags}" if tags else ""]
+            if part
+        )
+
+        return (
+            f"@dataset{{lodcloud{i},\n"
+            f"  title={{ {title} }},\n"
+            f"  year={{ {year} }},\n"
+            f"  publisher={{LOD Cloud}},\n"
+            f"  url={{ {url} }},\n"
+            f"  note={{ {note} }}\n"
+            f"}}\n\n"
+        )
 
-                f.write(
-                    f"@dataset{{lodcloud{i},\n"
-                    f"  title={{ {title} }},\n"
-                    f"  year={{ {year} }},\n"
-                    f"  publisher={{LOD Cloud}},\n"
-                    f"  url={{ {url} }},\n"
-                    f"  note={{ {note} }}\n"
-                    f"}}\n\n"
-                )
+    def save_bibtex(self, datasets, path):
+        with BibtexSink(path, self.bibtex_entry) as sink:
+            sink.write_all(datasets)
+        if sink.count:
+            print(f"[INFO] BibTeX saved: {path}")
+        else:
+            print("[WARN] No datasets to save (BibTeX).")
 
-        print(f"[INFO] BibTeX saved: {path}")
+    def output_sink(self, csv_path, bib_path, parquet_root=None, store=None):
+        """
+        CSV + BibTeX written as records arrive, finalized atomically.
+        parquet_root: also write the year-partitioned Parquet dataset (needs pyarrow).
+        store: CorpusStore to upsert the records into.
+        """
+        return TeeSink(self.csv_sink(csv_path), BibtexSink(bib_path, self.bibtex_entry),
+                       *parquet_sinks("lodcloud", parquet_root, row=self.csv_row),
+                       *store_sinks("lodcloud", store, row=self.csv_row))
 
 
-# ================= MAIN =================
-if __name__ == "__main__":
-    OUTPUT_DIR = "output-lodcloud"
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+# ================= HARVEST =================
+def harvest(output_dir="output-lodcloud", cache=None, store_path=STORE_PATH, parquet_root=PARQUET_ROOT):
+    """Full LOD Cloud run: streamed catalog, CSV, BibTeX, Parquet and corpus store. Returns the datasets saved."""
+    os.makedirs(output_dir, exist_ok=True)
 
     cloud_terms = [
         "cloud computing",
@@ -235,7 +357,7 @@ if __name__ == "__main__":
         "iot",
     ]
 
-    fetcher = LodCloudFetcher()
+    fetcher = LodCloudFetcher(cache=cache or ResponseCache(".http-cache"))
 
     datasets = fetcher.fetch(
         cloud_terms=cloud_terms,
@@ -243,9 +365,19 @@ if __name__ == "__main__":
         exclude_terms=exclude_terms,
         year_min=2014,
         year_max=2026,
+        streaming=True,
     )
 
-    fetcher.save_csv(datasets, f"{OUTPUT_DIR}/lodcloud_results.csv")
-    fetcher.save_bibtex(datasets, f"{OUTPUT_DIR}/lodcloud_results.bib")
+    store = CorpusStore(store_path)
+    with fetcher.output_sink(f"{output_dir}/lodcloud_results.csv",
+                             f"{output_dir}/lodcloud_results.bib", parquet_root, store) as sink:
+        saved = sink.write_all(datasets)
+    store.close()
+    print(f"[INFO] Datasets saved: {saved}")
+    return saved
 
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    harvest()
     print("[OK] LOD Cloud extraction completed")
@@ -1,24 +1,42 @@
 import requests
-import time
-import csv
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import os
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from http_client import HttpClient, TokenBucket
+from http_cache import ResponseCache
+from harvest_state import HarvestState, iter_merged_csv
+from record_sinks import BibtexSink, CsvSink, TeeSink
+from columnar_store import DEFAULT_ROOT as PARQUET_ROOT, parquet_sinks
+from corpus_store import DEFAULT_PATH as STORE_PATH, CorpusStore, store_sinks
+from harvest_journal import PageFetchError, open_journal
+from harvest_metrics import METRICS
 
 # ================= LOAD ENV =================
-dotenv_path = r"C:\Users\maria\Desktop\Cloud-Ontology\scopus_key.env"
-load_dotenv(dotenv_path)
-SCOPUS_API_KEY = os.getenv("SCOPUS_API_KEY")
-if not SCOPUS_API_KEY:
-    raise ValueError(f"SCOPUS_API_KEY not found in {dotenv_path}")
+# scopus_key.env lives in the repository root, next to Fetcher-Functions
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+dotenv_path = os.path.join(REPO_DIR, "scopus_key.env")
+
+
+def load_api_key(path=dotenv_path):
+    """Read SCOPUS_API_KEY when a harvest starts, so importing the module needs no key."""
+    load_dotenv(path)
+    api_key = os.getenv("SCOPUS_API_KEY")
+    if not api_key:
+        raise ValueError(f"SCOPUS_API_KEY not found in {path}")
+    return api_key
 
 # ================= FETCHER CLASS =================
 class ScopusFetcher:
-    def __init__(self, api_key, per_page=25, max_retries=3):
+    def __init__(self, api_key, per_page=25, max_retries=3, client=None, cache=None,
+                 journal_dir=None):
         """
         api_key: Elsevier API Key
         per_page: results per page (max 25/200)
         max_retries: retries in case of network/rate limit errors
+        client: shared HttpClient (optional)
+        cache: ResponseCache for on-disk responses (optional)
+        journal_dir: directory of page journals, to resume interrupted runs (optional)
         """
         self.base_url = "https://api.elsevier.com/content/search/scopus"
         self.headers = {
@@ -27,6 +45,9 @@ class ScopusFetcher:
         }
         self.per_page = per_page
         self.max_retries = max_retries
+        self.http = client or HttpClient(max_retries=max_retries, cache=cache, source="scopus")
+        self.journal_dir = journal_dir
+        self.journals = []
 
     # ------------------ Build Query ------------------
     def build_query(self, base_query, start_year=None, end_year=None,
@@ -45,120 +66,257 @@ class ScopusFetcher:
 
         return " ".join(query_parts)
 
+    # ------------------ Fetch Page ------------------
+    def fetch_page(self, query, start):
+        """Returns the search-results JSON for one offset; raises PageFetchError on failure."""
+        params = {"query": query, "start": start, "count": self.per_page}
+        try:
+            r = self.http.get(self.base_url, headers=self.headers, params=params)
+        except requests.exceptions.RequestException as e:
+            print(f"[ERROR] Unable to complete request for start={start}: {e}")
+            raise PageFetchError(f"Scopus start={start}: {e}") from e
+        if r.status_code != 200:
+            # 400/401/403 (bad query, bad key, entitlement) are errors too, not an empty last page
+            detail = self.error_message(r)
+            print(f"[ERROR] Unable to complete request for start={start} (HTTP {r.status_code}{detail})")
+            raise PageFetchError(f"Scopus start={start}: HTTP {r.status_code}{detail}")
+        return r.json().get("search-results", {})
+
+    def error_message(self, response):
+        """statusText of the body's service-error, if any (e.g. ': AUTHORIZATION_ERROR - Invalid API Key')."""
+        try:
+            body = response.json()
+        except ValueError:
+            return ""
+        status = (body.get("service-error") or {}).get("status") or {}
+        text = " - ".join(str(status[k]) for k in ("statusCode", "statusText") if status.get(k))
+        return f": {text}" if text else ""
+
+    def parse_entry(self, e):
+        return {
+            "scopus_id": e.get("dc:identifier", "").replace("SCOPUS_ID:", ""),
+            "eid": e.get("eid", ""),
+            "title": e.get("dc:title") or "",
+            "abstract": e.get("dc:description") or "",
+            "authors": e.get("dc:creator") or "",
+            "doi": e.get("prism:doi") or "",
+            "year": e.get("prism:coverDate") or "",
+            "source": e.get("prism:publicationName") or "",
+            "volume": e.get("prism:volume") or "",
+            "issue": e.get("prism:issueIdentifier") or "",
+            "pages": e.get("prism:pageRange") or "",
+            "issn": e.get("prism:issn") or "",
+            "isbn": e.get("prism:isbn") or "",
+            "affiliations": e.get("affiliation") or "",
+            "subject_areas": e.get("subject-areas") or "",
+            "references": e.get("citedby-count", 0),
+            "citations": e.get("citedby-count", 0),
+            "url": e.get("link", [{}])[0].get("@href") or "",
+            "language": e.get("language") or "",
+            "publisher": e.get("prism:publisher") or "",
+        }
+
     # ------------------ Fetch All ------------------
-    def fetch_all(self, query):
-        results = []
+    def fetch_all(self, query, concurrent=False, workers=4, requests_per_second=2):
+        """List version of iter_all (all records in memory)."""
+        return list(self.iter_all(query, concurrent, workers, requests_per_second))
+
+    def iter_all(self, query, concurrent=False, workers=4, requests_per_second=2):
+        """
+        Yields records page by page, in offset order, so they can be pushed
+        straight into a sink.
+        concurrent=False: one page at a time with a polite 1s pause.
+        concurrent=True: after the first page (which carries totalResults) all
+        remaining offsets are fetched on a thread pool, throttled to
+        requests_per_second (keep it within the API key quota).
+        """
+        if concurrent:
+            yield from self.iter_concurrent(query, workers, requests_per_second)
+            return
+
+        journal = self.journal_for(query)
+        count = 0
         start = 0
-        total_retrieved = 0
+        total_results = None
 
-        while True:
-            params = {"query": query, "start": start, "count": self.per_page}
-
-            for attempt in range(self.max_retries):
-                r = requests.get(self.base_url, headers=self.headers, params=params)
-                if r.status_code == 429:
-                    retry_after = int(r.headers.get("Retry-After", 30))
-                    print(f"[WARN] Rate limit reached, waiting {retry_after}s...")
-                    time.sleep(retry_after + 1)
-                    continue
-                elif r.status_code >= 500:
-                    print(f"[WARN] Server error {r.status_code}, retrying...")
-                    time.sleep(3)
-                    continue
-                else:
-                    break
-            else:
-                print(f"[ERROR] Unable to complete request for start={start}")
-                break
+        if journal:
+            done, start = journal.resume(0, self.per_page)
+            for cursor, records in done:
+                count += len(records)
+                total_results = journal.meta[cursor].get("total", total_results)
+                yield from records
+            if done and (not done[-1][1] or start >= (total_results or 0)):
+                print(f"[INFO] Total results retrieved: {count} (from journal)")
+                return
 
-            data = r.json()
-            entries = data.get("search-results", {}).get("entry", [])
+        while True:
+            data = self.fetch_page(query, start)
+            entries = data.get("entry", [])
+            total_results = int(data.get("opensearch:totalResults", 0))
+            records = [self.parse_entry(e) for e in entries]
+            if journal:
+                journal.record(start, records, total=total_results)
             if not entries:
                 break
 
-            for e in entries:
-                results.append({
-                    "scopus_id": e.get("dc:identifier", "").replace("SCOPUS_ID:", ""),
-                    "eid": e.get("eid", ""),
-                    "title": e.get("dc:title") or "",
-                    "abstract": e.get("dc:description") or "",
-                    "authors": e.get("dc:creator") or "",
-                    "doi": e.get("prism:doi") or "",
-                    "year": e.get("prism:coverDate") or "",
-                    "source": e.get("prism:publicationName") or "",
-                    "volume": e.get("prism:volume") or "",
-                    "issue": e.get("prism:issueIdentifier") or "",
-                    "pages": e.get("prism:pageRange") or "",
-                    "issn": e.get("prism:issn") or "",
-                    "isbn": e.get("prism:isbn") or "",
-                    "affiliations": e.get("affiliation") or "",
-                    "subject_areas": e.get("subject-areas") or "",
-                    "references": e.get("citedby-count", 0),
-                    "citations": e.get("citedby-count", 0),
-                    "url": e.get("link", [{}])[0].get("@href") or "",
-                    "language": e.get("language") or "",
-                    "publisher": e.get("prism:publisher") or "",
-                })
-
-            total_retrieved += len(entries)
-            total_results = int(data.get("search-results", {}).get("opensearch:totalResults", 0))
-            print(f"[INFO] Retrieved {total_retrieved}/{total_results} results...")
+            count += len(records)
+            METRICS.add_records("scopus", len(records))
+            yield from records
+            print(f"[INFO] Retrieved {count}/{total_results} results...")
 
             start += len(entries)
             if start >= total_results:
                 break
 
-            time.sleep(1)  # polite pause
+            METRICS.sleep("scopus", 1, "pause")  # polite pause
+
+        print(f"[INFO] Total results retrieved: {count}")
+
+    def fetch_all_concurrent(self, query, workers=4, requests_per_second=2):
+        return list(self.iter_concurrent(query, workers, requests_per_second))
+
+    def iter_concurrent(self, query, workers=4, requests_per_second=2):
+        journal = self.journal_for(query)
+        pages = dict(journal.pages) if journal else {}
+
+        if 0 in pages:
+            total_results = journal.meta[0].get("total", 0)
+        else:
+            first = self.fetch_page(query, 0)
+            total_results = int(first.get("opensearch:totalResults", 0))
+            pages[0] = [self.parse_entry(e) for e in first.get("entry", [])]
+            if journal:
+                journal.record(0, pages[0], total=total_results)
+        if not pages[0]:
+            print("[INFO] Total results retrieved: 0")
+            return
+
+        offsets = list(range(len(pages[0]), total_results, self.per_page))
+        missing = sum(1 for o in offsets if o not in pages)
+        print(f"[INFO] {total_results} results, fetching {missing} more pages "
+              f"with {workers} workers at {requests_per_second} req/s...")
+
+        bucket = TokenBucket(requests_per_second)
+
+        def fetch_offset(start):
+            if start in pages:  # already in the journal
+                return start, pages.pop(start)
+            METRICS.add_sleep("scopus", bucket.acquire(), "rate_limit")
+            data = self.fetch_page(query, start)
+            records = [self.parse_entry(e) for e in data.get("entry", [])]
+            if journal:
+                journal.record(start, records, total=total_results)
+            return start, records
 
-        print(f"[INFO] Total results retrieved: {len(results)}")
-        return results
+        count = len(pages[0])
+        METRICS.add_records("scopus", count)
+        yield from pages.pop(0)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # map() returns pages in offset order: each one is handed on as soon
+            # as it and all the previous ones are done
+            for start, records in pool.map(fetch_offset, offsets):
+                count += len(records)
+                METRICS.add_records("scopus", len(records))
+                print(f"[INFO] Retrieved offset {start}/{total_results} ({len(records)} entries)")
+                yield from records
+
+        print(f"[INFO] Total results retrieved: {count}")
+
+    # ------------------ Journal ------------------
+    def journal_for(self, query):
+        journal = open_journal(self.journal_dir, "scopus", f"{query}|{self.per_page}")
+        if journal:
+            self.journals.append(journal)
+        return journal
+
+    def finish_journals(self):
+        """Call once the final outputs are on disk."""
+        for journal in self.journals:
+            journal.finish()
+        self.journals = []
+
+    # ------------------ Fetch Delta ------------------
+    def fetch_delta(self, query, state, csv_path, sink, **fetch_kwargs):
+        """
+        Incremental harvest: after the first run only records loaded since
+        the last high-water mark are requested (LOAD-DATE bound) and merged
+        into the existing CSV by EID, streaming everything into sink.
+        The mark advances only once the sink has been finalized.
+        Returns the number of records written.
+        """
+        since = state.get("scopus", query)
+        mark = state.today()
+        if since is None:
+            print("[INFO] No high-water mark: full harvest")
+            records = self.iter_all(query, **fetch_kwargs)
+        else:
+            bound = (date.fromisoformat(since) - timedelta(days=1)).strftime("%Y%m%d")
+            print(f"[INFO] Delta harvest: records loaded after {bound}")
+            delta = self.fetch_all(f"{query} AND LOAD-DATE AFT {bound}", **fetch_kwargs)
+            records = iter_merged_csv(csv_path, delta, lambda r: r.get("eid") or r.get("scopus_id"))
+        with sink:
+            count = sink.write_all(records)
+        state.set("scopus", query, mark)
+        return count
+
+    # ------------------ Sinks ------------------
+    def output_sink(self, csv_path, bib_path, parquet_root=None, store=None):
+        """
+        CSV + BibTeX written page by page, finalized atomically.
+        parquet_root: also write the year-partitioned Parquet dataset (needs pyarrow).
+        store: CorpusStore to upsert the records into.
+        """
+        return TeeSink(CsvSink(csv_path, flush_every=self.per_page),
+                       BibtexSink(bib_path, self.bibtex_entry, flush_every=self.per_page),
+                       *parquet_sinks("scopus", parquet_root),
+                       *store_sinks("scopus", store))
 
     # ------------------ Save CSV ------------------
     def save_csv(self, records, path):
-        if not records:
+        with CsvSink(path, flush_every=self.per_page) as sink:
+            sink.write_all(records)
+        if sink.count:
+            print(f"[INFO] CSV saved to: {path}")
+        else:
             print("[WARN] No records to save.")
-            return
-        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-        fieldnames = list(records[0].keys())
-        with open(path, "w", newline="", encoding="utf-8-sig") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(records)
-        print(f"[INFO] CSV saved to: {path}")
 
     # ------------------ Save BibTeX ------------------
-    def save_bib(self, records, path):
-        if not records:
-            print("[WARN] No records to save (BibTeX).")
-            return
-        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-        with open(path, "w", encoding="utf-8") as f:
-            for i, rec in enumerate(records):
-                key = f"scopus{i+1}"
-                title = (rec.get("title") or "").replace("{", "\\{").replace("}", "\\}")
-                abstract = (rec.get("abstract") or "").replace("{", "\\{").replace("}", "\\}")
-                authors = (rec.get("authors") or "").replace("{", "\\{").replace("}", "\\}")
-                year = ''
-                if rec.get("year"):
-                    try:
-                        year = datetime.strptime(rec["year"], "%Y-%m-%d").year
-                    except Exception:
-                        year = rec["year"][:4]
-                url = rec.get("url") or ""
-                f.write(f"""@article{{{key},
+    def bibtex_entry(self, rec, i):
+        key = f"scopus{i}"
+        title = (rec.get("title") or "").replace("{", "\\{").replace("}", "\\}")
+        abstract = (rec.get("abstract") or "").replace("{", "\\{").replace("}", "\\}")
+        authors = (rec.get("authors") or "").replace("{", "\\{").replace("}", "\\}")
+        year = ''
+        if rec.get("year"):
+            try:
+                year = datetime.strptime(rec["year"], "%Y-%m-%d").year
+            except Exception:
+                year = rec["year"][:4]
+        url = rec.get("url") or ""
+        return f"""@article{{{key},
   title={{ {title} }},
   author={{ {authors} }},
   year={{ {year} }},
   abstract={{ {abstract} }},
   url={{ {url} }}
-}}\n\n""")
-        print(f"[INFO] BibTeX saved to: {path}")
+}}\n\n"""
 
+    def save_bib(self, records, path):
+        with BibtexSink(path, self.bibtex_entry, flush_every=self.per_page) as sink:
+            sink.write_all(records)
+        if sink.count:
+            print(f"[INFO] BibTeX saved to: {path}")
+        else:
+            print("[WARN] No records to save (BibTeX).")
 
-# ================= MAIN =================
-if __name__ == "__main__":
-    OUTPUT_DIR = "output-scopus"
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+# ================= HARVEST =================
+def harvest(output_dir="output-scopus", cache=None, store_path=STORE_PATH, parquet_root=PARQUET_ROOT):
+    """
+    Full Scopus run: delta fetch merged into the CSV, BibTeX, Parquet and corpus store.
+    cache: shared ResponseCache (optional). Returns the number of records written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
 
     # Query based on TITLE-ABS-KEY
     base_query = (
@@ -174,17 +332,31 @@ if __name__ == "__main__":
     start_year = 2014
     end_year = 2026
 
-    fetcher = ScopusFetcher(SCOPUS_API_KEY)
+    fetcher = ScopusFetcher(load_api_key(), cache=cache or ResponseCache(".http-cache"),
+                            journal_dir=os.path.join(output_dir, "journal"))
     query = fetcher.build_query(base_query, start_year=start_year, end_year=end_year,
                                 doc_types=doc_types, language=language)
 
     print(f"[INFO] Executing query: {query}")
-    records = fetcher.fetch_all(query)
+    csv_path = os.path.join(output_dir, "scopus_cloud.csv")
+    bib_path = os.path.join(output_dir, "scopus_cloud.bib")
+
+    # concurrent=True: offsets fetched in parallel, throttled to the key quota
+    # fetch_delta: only records loaded since the last run, merged into csv_path
+    # records go to disk page by page; the files are swapped in at the end
+    state = HarvestState(os.path.join(output_dir, "harvest-state.json"))
+    store = CorpusStore(store_path)
+    sink = fetcher.output_sink(csv_path, bib_path, parquet_root, store)
+    count = fetcher.fetch_delta(query, state, csv_path, sink,
+                                concurrent=True, workers=4, requests_per_second=2)
+    store.close()
+    fetcher.finish_journals()
 
-    csv_path = os.path.join(OUTPUT_DIR, "scopus_cloud.csv")
-    bib_path = os.path.join(OUTPUT_DIR, "scopus_cloud.bib")
+    print(f"[INFO] Records saved: {count} ({csv_path}, {bib_path})")
+    return count
 
-    fetcher.save_csv(records, csv_path)
-    fetcher.save_bib(records, bib_path)
 
+# ================= MAIN =================
+if __name__ == "__main__":
+    harvest()
     print("[OK] Scopus extraction completed")
@@ -1,7 +1,10 @@
 import pandas as pd
-from openpyxl import load_workbook
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, Border, Side, Font
-from openpyxl.worksheet.table import Table, TableStyleInfo
+from openpyxl.worksheet.filters import AutoFilter
+from openpyxl.worksheet.hyperlink import Hyperlink
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
 from openpyxl.utils import get_column_letter
 from pathlib import Path
 import sys
@@ -9,7 +12,15 @@ import csv
 import re
 import html
 import unicodedata
+import warnings
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from columnar_store import available as parquet_available, read_source
+from corpus_store import CorpusStore, RECORD_KEYS
+from harvest_metrics import METRICS
+from export_parsers import count_bibtex_entries
+from near_duplicates import find_near_duplicates, save_clusters
 
 csv.field_size_limit(50 * 1024 * 1024)  # 50 MB
 
@@ -17,12 +28,8 @@ csv.field_size_limit(50 * 1024 * 1024)  # 50 MB
 # ================= COUNT RECORDS =====================
 # =====================================================
 def count_bibtex_records(bib_path):
-    count = 0
-    with open(bib_path, "r", encoding="utf-8") as f:
-        for line in f:
-            if line.strip().startswith("@"):
-                count += 1
-    return count
+    # conta le voci, anche quelle che iniziano a metà riga (export IEEE)
+    return count_bibtex_entries(bib_path)
 
 def count_csv_records(csv_path):
     with open(csv_path, "r", encoding="utf-8-sig") as f:
@@ -33,12 +40,16 @@ def count_csv_records(csv_path):
 # =====================================================
 # ================= PATHS =============================
 # =====================================================
-zenodo_csv = r"C:\Users\maria\Desktop\Cloud-Ontology\Fetcher-Functions\output-zenodo\zenodo_all_years.csv"
-output_dir = Path(r"C:\Users\maria\Desktop\Cloud-Ontology\Fetcher-Functions\output-zenodo")
+# relativi a Fetcher-Functions, qualunque sia la cartella di lavoro
+output_dir = Path(__file__).resolve().parent / "output-zenodo"
+zenodo_csv = output_dir / "zenodo_all_years.csv"
 
 zenodo_xlsx = output_dir / "zenodo_all_years.xlsx"
 duplicates_csv = output_dir / "zenodo_duplicates_removed.csv"
+near_duplicates_csv = output_dir / "zenodo_near_duplicates.csv"
+corpus_path = output_dir.parent / "corpus.sqlite"
 bibtex_path = output_dir / "zenodo_all_years.bib"
+parquet_root = output_dir.parent / "output-parquet"
 
 # =====================================================
 # ================= CSV UTILS =========================
@@ -57,9 +68,27 @@ def read_csv_stable(file_path):
     print(f"[INFO] CSV letto: {len(df)} righe")
     return df
 
+def read_zenodo(csv_path, parquet_dir):
+    """Dataset Parquet se presente (colonne tipizzate, niente sniffing), altrimenti il CSV."""
+    if parquet_available("zenodo", parquet_dir):
+        df = read_source("zenodo", parquet_dir).drop(columns="pub_year")
+        print(f"[INFO] Parquet letto: {len(df)} righe")
+        return df
+    return read_csv_stable(csv_path)
+
 # =====================================================
 # ================= TEXT CLEANING =====================
 # =====================================================
+RE_SCRIPT_STYLE = re.compile(r'<(script|style).*?>.*?</\1>', flags=re.DOTALL | re.IGNORECASE)
+RE_TAG = re.compile(r'<[^>]+>')
+RE_ENTITY = re.compile(r'&[a-zA-Z0-9#]+;')
+RE_INVISIBLE = re.compile(r'[\x00-\x1F\x7F]')
+RE_SPACES = re.compile(r'\s+')
+
+# colonne di testo libero lunghe: pulite in parallelo su più processi
+HEAVY_TEXT_COLUMNS = ("abstract", "description", "keywords")
+
+
 def clean_text(s):
     """
     Pulizia HTML aggressiva:
@@ -75,33 +104,62 @@ def clean_text(s):
     s = str(s)
 
     # 1. Rimuove script e style
-    s = re.sub(
-        r'<(script|style).*?>.*?</\1>',
-        '',
-        s,
-        flags=re.DOTALL | re.IGNORECASE
-    )
+    s = RE_SCRIPT_STYLE.sub('', s)
 
     # 2. Rimuove tutti i tag HTML
-    s = re.sub(r'<[^>]+>', ' ', s)
+    s = RE_TAG.sub(' ', s)
 
     # 3. Decodifica entità HTML
     s = html.unescape(s)
 
     # 4. Rimuove entità residue
-    s = re.sub(r'&[a-zA-Z0-9#]+;', ' ', s)
+    s = RE_ENTITY.sub(' ', s)
 
     # 5. Normalizzazione Unicode
     s = unicodedata.normalize("NFKC", s)
 
     # 6. Rimuove caratteri invisibili
-    s = re.sub(r'[\x00-\x1F\x7F]', ' ', s)
+    s = RE_INVISIBLE.sub(' ', s)
 
     # 7. Collassa spazi
-    s = re.sub(r'\s+', ' ', s)
+    s = RE_SPACES.sub(' ', s)
 
     return s.strip()
 
+def clean_series(series):
+    """Stessi passi di clean_text, applicati all'intera colonna con le operazioni .str di pandas."""
+    s = series.astype(object).where(series.notna(), "").map(str)
+    s = s.str.replace(RE_SCRIPT_STYLE, '', regex=True)
+    s = s.str.replace(RE_TAG, ' ', regex=True)
+    s = s.map(html.unescape)
+    s = s.str.replace(RE_ENTITY, ' ', regex=True)
+    s = s.str.normalize("NFKC")
+    s = s.str.replace(RE_INVISIBLE, ' ', regex=True)
+    # \s di re e str.split() usano la stessa definizione di spazio:
+    # split + join equivale a collassare gli spazi e fare strip, ma è molto più veloce
+    return s.str.split().str.join(' ').astype(str)
+
+def clean_dataframe(df, heavy_columns=HEAVY_TEXT_COLUMNS, workers=None, chunk_size=2000, parallel=True):
+    """
+    Pulisce tutte le colonne (output identico a df[col].apply(clean_text)).
+    Le colonne di testo libero lunghe vengono divise in blocchi e pulite
+    su un pool di processi; le altre restano nel processo principale.
+    parallel=False: tutto nel processo principale (es. dentro i thread di pipeline.py).
+    """
+    df = df.copy()
+    heavy = [c for c in df.columns if parallel and c in heavy_columns and len(df) > chunk_size]
+
+    for col in df.columns:
+        if col not in heavy:
+            df[col] = clean_series(df[col])
+
+    if heavy:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for col in heavy:
+                chunks = [df[col].iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size)]
+                df[col] = pd.concat(list(pool.map(clean_series, chunks)))
+    return df
+
 def normalize_title(title):
     title = (title or "").lower()
     title = re.sub(r"[^\w\s]", "", title)
@@ -116,36 +174,51 @@ def parse_date(d):
 # =====================================================
 # ================= DEDUPLICATION =====================
 # =====================================================
-def deduplicate(df):
-    unique = {}
-    duplicates = []
+def normalize_series(series):
+    """normalize_title su un'intera colonna."""
+    s = series.astype(object).where(series.notna(), "").map(str)
+    s = s.str.lower().str.replace(r"[^\w\s]", "", regex=True)
+    return s.str.replace(r"\s+", " ", regex=True).str.strip()
 
-    for _, row in df.iterrows():
-        title = normalize_title(row.get("title"))
-        authors = normalize_title(row.get("authors"))
-        doi = str(row.get("doi", "")).strip().lower()
-        url = str(row.get("url", "")).strip().lower()
+def dedup_keys(df):
+    """
+    Chiave di deduplicazione per riga, in ordine di preferenza:
+    titolo + autori normalizzati, poi DOI, poi URL ("" = nessuna chiave).
+    """
+    def column(name):
+        return df[name] if name in df.columns else pd.Series("", index=df.index, dtype=object)
 
-        if title and authors:
-            key = f"title_auth::{title}::{authors}"
-        elif doi:
-            key = f"doi::{doi}"
-        elif url:
-            key = f"url::{url}"
-        else:
-            continue
+    title = normalize_series(column("title"))
+    authors = normalize_series(column("authors"))
+    # come str(row.get(...)): un valore mancante diventa "nan"
+    doi = column("doi").astype(object).map(str).str.strip().str.lower()
+    url = column("url").astype(object).map(str).str.strip().str.lower()
 
-        if key not in unique:
-            unique[key] = row
-        else:
-            duplicates.append(row)
+    keys = pd.Series("", index=df.index, dtype=object)
+    keys = keys.mask(url != "", "url::" + url)
+    keys = keys.mask(doi != "", "doi::" + doi)
+    keys = keys.mask((title != "") & (authors != ""), "title_auth::" + title + "::" + authors)
+    return keys
 
-    return pd.DataFrame(unique.values()), pd.DataFrame(duplicates)
+def deduplicate(df):
+    """
+    Tiene la prima occorrenza di ogni chiave (vedi dedup_keys) e restituisce
+    (record unici, duplicati rimossi); le righe senza chiave vengono scartate.
+    Le chiavi sono ridotte a un hash a 64 bit e confrontate con duplicated().
+    """
+    keys = dedup_keys(df)
+    has_key = (keys != "").to_numpy()
+    hashes = pd.util.hash_pandas_object(keys[has_key], index=False)
+    is_dup = hashes.duplicated(keep="first").to_numpy()
+
+    keyed = df[has_key]
+    return keyed[~is_dup].reset_index(drop=True), keyed[is_dup].reset_index(drop=True)
 
 # =====================================================
 # ================= EXCEL FORMAT ======================
 # =====================================================
 def format_excel_table(excel_path):
+    """Formattazione di un file già scritto (rilegge tutto il workbook: per i nuovi export usare export_excel)."""
     wb = load_workbook(excel_path)
     ws = wb.active
 
@@ -189,6 +262,80 @@ def format_excel_table(excel_path):
 
     wb.save(excel_path)
 
+
+EXCEL_MAX_CELL = 32767
+
+def column_widths(df):
+    """Larghezze come in format_excel_table: testo più lungo (intestazione esclusa) + 2, massimo 60."""
+    widths = []
+    for col in df.columns:
+        s = df[col].dropna()
+        s = s[s.map(bool)].astype(str)
+        widths.append(min((s.str.len().max() if len(s) else 0) + 2, 60))
+    return widths
+
+def link_for(value):
+    if value.startswith("10."):
+        return f"https://doi.org/{value}"
+    if value.startswith("http"):
+        return value
+    return None
+
+def export_excel(df, excel_path, table_name="ZenodoTable"):
+    """
+    Export Excel in un solo passaggio (workbook write-only, memoria costante):
+    stesso risultato di to_excel + format_excel_table
+    - larghezze colonne calcolate prima dal DataFrame
+    - stili condivisi tra le celle, link DOI / URL scritti insieme alla cella
+    - tabella TableStyleMedium9 su tutto l'intervallo
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+
+    thin = Side(border_style="thin", color="000000")
+    border = Border(top=thin, left=thin, right=thin, bottom=thin)
+    alignment = Alignment(wrap_text=True, vertical="top")
+    link_font = Font(color="0000EE", underline="single")
+
+    letters = [get_column_letter(i) for i in range(1, len(df.columns) + 1)]
+    for letter, width in zip(letters, column_widths(df)):
+        ws.column_dimensions[letter].width = width
+
+    def styled(value):
+        cell = WriteOnlyCell(ws, value)
+        cell.alignment = alignment
+        cell.border = border
+        return cell
+
+    headers = [str(c) for c in df.columns]
+    ws.append([styled(h) for h in headers])
+
+    for row_idx, values in enumerate(df.itertuples(index=False, name=None), start=2):
+        row = []
+        for letter, value in zip(letters, values):
+            if value is None or (isinstance(value, float) and pd.isna(value)):
+                value = None
+            elif isinstance(value, str) and len(value) > EXCEL_MAX_CELL:
+                value = value[:EXCEL_MAX_CELL]  # limite di Excel, come to_excel
+            cell = styled(value)
+            link = link_for(value) if isinstance(value, str) else None
+            if link:
+                cell.font = link_font
+                cell.hyperlink = Hyperlink(ref=f"{letter}{row_idx}", target=link)
+            row.append(cell)
+        ws.append(row)
+
+    ref = f"A1:{letters[-1] if letters else 'A'}{len(df) + 1}"
+    table = Table(displayName=table_name, ref=ref, autoFilter=AutoFilter(ref=ref))
+    table.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showRowStripes=True)
+    # in modalità write-only le colonne della tabella vanno dichiarate a mano
+    table.tableColumns = [TableColumn(id=i, name=h) for i, h in enumerate(headers, start=1)]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ws.add_table(table)
+
+    wb.save(excel_path)
+
 # =====================================================
 # ================= BIBTEX EXPORT =====================
 # =====================================================
@@ -211,23 +358,48 @@ def export_bibtex(df, path):
 # =====================================================
 # ================= PIPELINE ==========================
 # =====================================================
-print("\n📚 Post-processing Zenodo finale")
-
-df = read_csv_stable(zenodo_csv)
-
-for col in df.columns:
-    df[col] = df[col].apply(clean_text)
-
-df_clean, df_duplicates = deduplicate(df)
-
-df_clean.to_excel(zenodo_xlsx, index=False)
-df_duplicates.to_csv(duplicates_csv, index=False, encoding="utf-8-sig")
-
-format_excel_table(zenodo_xlsx)
-export_bibtex(df_clean, bibtex_path)
-
-print("\n✅ COMPLETATO")
-print(f"✔ Record finali: {len(df_clean)}")
-print(f"🗑️ Duplicati rimossi: {len(df_duplicates)}")
-print(f"📄 Excel: {zenodo_xlsx}")
-print(f"📚 BibTeX: {bibtex_path}")
+def run(parallel=True):
+    """
+    Post-processing completo: pulizia, deduplicazione, Excel, BibTeX, archivio. Restituisce i record finali.
+    parallel=False: pulizia senza pool di processi.
+    """
+    print("\n📚 Post-processing Zenodo finale")
+
+    df = read_zenodo(zenodo_csv, str(parquet_root))
+
+    df = clean_dataframe(df, parallel=parallel)
+
+    df_clean, df_duplicates = deduplicate(df)
+    METRICS.add_records("zenodo", 0, duplicates=len(df_duplicates))
+
+    export_excel(df_clean, zenodo_xlsx)
+    df_duplicates.to_csv(duplicates_csv, index=False, encoding="utf-8-sig")
+
+    # quasi-duplicati: solo segnalati per la revisione manuale, non rimossi
+    records = df_clean.to_dict("records")
+    near_clusters = find_near_duplicates(records, fields=("title", "abstract"), threshold=0.8)
+    save_clusters(near_duplicates_csv, near_clusters, records)
+
+    export_bibtex(df_clean, bibtex_path)
+
+    # archivio del corpus: record ripuliti + duplicati esatti esclusi dallo screening
+    store = CorpusStore(str(corpus_path))
+    store.upsert("zenodo", records)
+    kept = {RECORD_KEYS["zenodo"](r) for r in records}
+    dup_keys = {RECORD_KEYS["zenodo"](r) for r in df_duplicates.to_dict("records")} - kept
+    # solo sui record ancora da valutare: non tocca le decisioni dei revisori
+    store.set_decision(store.ids_for_keys("zenodo", dup_keys), "exclude", reason="duplicato",
+                       overwrite=False)
+    store.close()
+
+    print("\n✅ COMPLETATO")
+    print(f"✔ Record finali: {len(df_clean)}")
+    print(f"🗑️ Duplicati rimossi: {len(df_duplicates)}")
+    print(f"🔎 Cluster di quasi-duplicati da rivedere: {len(near_clusters)} ({near_duplicates_csv})")
+    print(f"📄 Excel: {zenodo_xlsx}")
+    print(f"📚 BibTeX: {bibtex_path}")
+    print(f"🗄️ Archivio: {corpus_path}")
+    return len(df_clean)
+
+if __name__ == "__main__":
+    run()
@@ -1,25 +1,44 @@
 import requests
-import csv
-import time
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http_client import HttpClient
+from http_cache import ResponseCache
+from harvest_state import HarvestState, iter_csv_records, iter_merged_csv
+from record_sinks import BibtexSink, CsvSink, PartitionSink, TeeSink
+from columnar_store import DEFAULT_ROOT as PARQUET_ROOT, parquet_sinks
+from corpus_store import DEFAULT_PATH as STORE_PATH, CorpusStore, store_sinks
+from harvest_journal import PageFetchError, open_journal
+from harvest_metrics import METRICS
 
 class ZenodoFetcher:
     """
     Zenodo fetcher robusto e metodologicamente corretto.
     - Query OR-based (Scopus / ACM–like)
     - NO filtro temporale nella query (best practice Zenodo)
-    - Filtro per anno lato Python
+    - Filtro per anno lato Python (single-pass: una sola scansione per tutti gli anni)
+    - Modalità sharded opzionale: intervalli created:[a TO b} in parallelo
     - Deduplicazione DOI / URL / ID
-    - CSV + BibTeX
+    - CSV + BibTeX scritti in streaming (file per anno + file complessivo)
     """
 
-    def __init__(self, token_path=None, per_page=100, max_retries=3, sleep_time=1):
+    def __init__(self, token_path=None, per_page=100, max_retries=3, sleep_time=1,
+                 max_window=10000, client=None, cache=None, journal_dir=None):
         self.base_url = "https://zenodo.org/api/records"
         self.per_page = min(per_page, 100)
         self.max_retries = max_retries
         self.sleep_time = sleep_time
+        # Zenodo non permette di paginare oltre page * size > max_window
+        self.max_window = max_window
         self.token = self.load_token(token_path)
         self.headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        self.http = client or HttpClient(max_retries=max_retries, cache=cache, source="zenodo")
+        # journal delle pagine completate: una run interrotta riprende da lì
+        # (un file per query, quindi uno per shard; la lista è condivisa dai worker)
+        self.journal_dir = journal_dir
+        self.journals = []
+        self.journal_lock = threading.Lock()
 
         if self.token:
             print("[INFO] Token Zenodo caricato.")
@@ -44,112 +63,323 @@ class ZenodoFetcher:
         return f"{q_cloud} AND {q_sem} AND NOT {q_exc}"
 
     # ================= FETCH PAGE =================
-    def fetch_page(self, query, page):
+    def fetch_json(self, query, page, size, sort=None):
         params = {
             "q": query,
             "page": page,
-            "size": self.per_page
+            "size": size
         }
-        for attempt in range(self.max_retries):
-            try:
-                r = requests.get(self.base_url, params=params, headers=self.headers, timeout=30)
-                r.raise_for_status()
-                return r.json().get("hits", {}).get("hits", [])
-            except requests.exceptions.RequestException as e:
-                wait = 2 ** attempt
-                print(f"[WARN] Pagina {page} errore: {e} – retry {wait}s")
-                time.sleep(wait)
-        return []
+        if sort:
+            params["sort"] = sort
+        try:
+            r = self.http.get(self.base_url, params=params, headers=self.headers)
+            r.raise_for_status()
+            return r.json()
+        except requests.exceptions.RequestException as e:
+            # retry esauriti: errore, non "fine dei risultati"
+            print(f"[ERROR] Pagina {page} non scaricata: {e}")
+            raise PageFetchError(f"Zenodo pagina {page}: {e}") from e
 
-    # ================= FETCH YEAR =================
-    def fetch_year(self, query, year):
-        print(f"\n[INFO] Fetch anno {year}")
-        results = []
-        seen = set()
+    def fetch_page(self, query, page, sort=None):
+        return self.fetch_json(query, page, self.per_page, sort).get("hits", {}).get("hits", [])
+
+    def count_hits(self, query):
+        total = self.fetch_json(query, 1, 1).get("hits", {}).get("total", 0)
+        # alcune versioni dell'API restituiscono {"value": N, "relation": ...}
+        if isinstance(total, dict):
+            total = total.get("value", 0)
+        return int(total or 0)
+
+    # ================= PARSE HIT =================
+    def parse_hit(self, item):
+        md = item.get("metadata", {})
+        created = item.get("created", "")
+        rec_year = int(created[:4]) if created[:4].isdigit() else None
+        doi = md.get("doi")
+        url = item.get("links", {}).get("html")
+        creators = md.get("creators", [])
+        record = {
+            "title": md.get("title"),
+            "authors": ", ".join(a.get("name", "") for a in creators),
+            "abstract": md.get("description"),
+            "year": rec_year,
+            "keywords": ", ".join(md.get("keywords", [])) if md.get("keywords") else "",
+            "doi": doi,
+            "url": url,
+            "type": md.get("resource_type", {}).get("type"),
+        }
+        key = doi or url or str(item.get("id"))
+        return key, record
+
+    # ================= ITER HITS =================
+    def iter_hits(self, query, sort=None):
+        """
+        Scorre tutte le pagine della query una sola volta (riprendendo dal journal).
+        Si ferma alla finestra di paginazione (page * size <= max_window): oltre Zenodo risponde 400.
+        """
+        journal = self.journal_for(query, sort)
         page = 1
+        if journal:
+            done, page = journal.resume(1, 1)
+            for _, hits in done:
+                yield from hits
+            if done and len(done[-1][1]) < self.per_page:
+                return
 
         while True:
-            hits = self.fetch_page(query, page)
+            if page * self.per_page > self.max_window:
+                print(f"[WARN] Finestra di paginazione raggiunta ({self.max_window} hit): "
+                      f"eventuali risultati successivi non sono recuperabili ({query})")
+                break
+            hits = self.fetch_page(query, page, sort)
+            if journal:
+                journal.record(page, hits)
             if not hits:
                 break
 
-            for item in hits:
-                md = item.get("metadata", {})
-                created = item.get("created", "")
-                rec_year = int(created[:4]) if created[:4].isdigit() else None
-                if rec_year != year:
-                    continue
-
-                doi = md.get("doi")
-                url = item.get("links", {}).get("html")
-                key = doi or url or str(item.get("id"))
-                if key in seen:
-                    continue
-                seen.add(key)
-
-                creators = md.get("creators", [])
-                results.append({
-                    "title": md.get("title"),
-                    "authors": ", ".join(a.get("name", "") for a in creators),
-                    "abstract": md.get("description"),
-                    "year": rec_year,
-                    "keywords": ", ".join(md.get("keywords", [])) if md.get("keywords") else "",
-                    "doi": doi,
-                    "url": url,
-                    "type": md.get("resource_type", {}).get("type"),
-                })
+            yield from hits
 
             if len(hits) < self.per_page:
                 break
 
             page += 1
-            time.sleep(self.sleep_time)
+            METRICS.sleep("zenodo", self.sleep_time, "pause")
+
+    # ================= JOURNAL =================
+    def journal_for(self, query, sort=None):
+        journal = open_journal(self.journal_dir, "zenodo", f"{query}|{sort}|{self.per_page}")
+        if journal:
+            with self.journal_lock:
+                self.journals.append(journal)
+        return journal
+
+    def finish_journals(self):
+        """Da chiamare quando tutti gli output sono stati salvati."""
+        with self.journal_lock:
+            journals, self.journals = self.journals, []
+        for journal in journals:
+            journal.finish()
+
+    # ================= SINKS =================
+    def file_sink(self, base):
+        """CSV + BibTeX scritti in streaming (base.csv / base.bib)."""
+        return TeeSink(CsvSink(base + ".csv", flush_every=self.per_page),
+                       BibtexSink(base + ".bib", self.bibtex_entry, flush_every=self.per_page))
+
+    def year_path(self, year):
+        return f"output-zenodo/zenodo_{year}"
+
+    def year_sinks(self):
+        """Un file CSV + BibTeX per anno, aperto al primo record di quell'anno."""
+        return PartitionSink(lambda r: str(r["year"]), lambda y: self.file_sink(self.year_path(y)))
 
-        self.save_csv(results, f"output-zenodo/zenodo_{year}.csv")
-        self.save_bibtex(results, f"output-zenodo/zenodo_{year}.bib")
+    def drain(self, records, sink=None):
+        """
+        Scrive i record nel sink man mano che arrivano (default: file per anno);
+        restituisce quanti record sono stati scritti.
+        """
+        if sink is not None:
+            return sink.write_all(records)
+        with self.year_sinks() as sink:
+            n = sink.write_all(records)
+        for y, count in sorted(sink.counts().items()):
+            print(f"[INFO] Record anno {y}: {count}")
+        return n
+
+    # ================= RECORDS =================
+    def iter_records(self, hits, from_year, to_year):
+        """Record unici per anno nell'intervallo, nell'ordine in cui arrivano gli hit."""
+        seen = {y: set() for y in range(from_year, to_year + 1)}
+        for item in hits:
+            key, record = self.parse_hit(item)
+            year = record["year"]
+            if year not in seen:
+                continue
+            if key in seen[year]:
+                METRICS.add_records("zenodo", 0, duplicates=1)
+                continue
+            seen[year].add(key)
+            METRICS.add_records("zenodo")
+            yield record
+
+    # ================= SAVE YEAR =================
+    def save_year(self, results, year):
+        with self.file_sink(self.year_path(year)) as sink:
+            sink.write_all(results)
         print(f"[INFO] Record anno {year}: {len(results)}")
-        return results
+
+    # ================= FETCH YEAR =================
+    def fetch_year(self, query, year, sink=None):
+        print(f"\n[INFO] Fetch anno {year}")
+        return self.drain(self.iter_records(self.iter_hits(query), year, year), sink)
 
     # ================= FETCH ALL =================
-    def fetch_all(self, query, from_year, to_year):
-        all_records = []
+    def fetch_all(self, query, from_year, to_year, single_pass=True, sink=None):
+        """
+        single_pass=True: una sola scansione della query, ogni record
+        viene scritto nel file del proprio anno appena arriva.
+        single_pass=False: una scansione completa per ogni anno (fetch_year).
+        sink: destinazione dei record (default: un CSV + BibTeX per anno).
+        Restituisce il numero di record scritti.
+        """
+        if not single_pass:
+            total = sum(self.fetch_year(query, y, sink) for y in range(from_year, to_year + 1))
+        else:
+            print(f"\n[INFO] Fetch single-pass {from_year}-{to_year}")
+            total = self.drain(self.iter_records(self.iter_hits(query), from_year, to_year), sink)
+        print(f"\n[INFO] Totale record {from_year}-{to_year}: {total}")
+        return total
+
+    # ================= SHARDS =================
+    def shard_query(self, query, start, end):
+        # intervallo semichiuso [start, end): nessun record conteggiato due volte
+        return f"({query}) AND created:[{start.isoformat()} TO {end.isoformat()}}}"
+
+    def build_shards(self, query, start, end):
+        """
+        Divide [start, end) in intervalli di date il cui numero di hit
+        rientra nella finestra di paginazione di Zenodo (bisezione ricorsiva).
+        """
+        total = self.count_hits(self.shard_query(query, start, end))
+        if total == 0:
+            return []
+        if total <= self.max_window:
+            return [(start, end, total)]
+
+        days = (end - start).days
+        if days <= 1:
+            print(f"[WARN] Shard {start} contiene {total} hit (> {self.max_window}): "
+                  f"verranno scaricati solo i primi {self.max_window}")
+            return [(start, end, total)]
+
+        mid = start + timedelta(days=days // 2)
+        return self.build_shards(query, start, mid) + self.build_shards(query, mid, end)
+
+    def fetch_shard(self, query, shard):
+        start, end, total = shard
+        hits = list(self.iter_hits(self.shard_query(query, start, end)))
+        if len(hits) < total:
+            print(f"[WARN] Shard {start} → {end} troncato: {len(hits)}/{total} hit")
+        else:
+            print(f"[INFO] Shard {start} → {end}: {len(hits)}/{total} hit")
+        return hits
+
+    # ================= FETCH SHARDED =================
+    def fetch_all_sharded(self, query, from_year, to_year, workers=4, sink=None):
+        """
+        Come fetch_all, ma la query viene divisa in intervalli created:[a TO b}
+        scaricati in parallelo su un pool di al più `workers` thread;
+        ogni shard viene scritto appena completato (in memoria al più gli shard in corso).
+        """
+        print(f"\n[INFO] Fetch sharded {from_year}-{to_year} ({workers} worker)")
+        shards = self.build_shards(query, date(from_year, 1, 1), date(to_year + 1, 1, 1))
+        print(f"[INFO] Shard pianificati: {len(shards)}")
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pages = pool.map(lambda sh: self.fetch_shard(query, sh), shards)
+            hits = (item for shard_hits in pages for item in shard_hits)
+            total = self.drain(self.iter_records(hits, from_year, to_year), sink)
+        print(f"\n[INFO] Totale record {from_year}-{to_year}: {total}")
+        return total
+
+    # ================= FETCH DELTA =================
+    def fetch_delta(self, query, from_year, to_year, state, sink=None):
+        """
+        Harvest incrementale: dalla seconda run chiede solo i record
+        aggiornati dall'ultimo high-water mark (sort per updated) e li
+        unisce ai file per anno già esistenti, riga per riga.
+        """
+        since = state.get("zenodo", query)
+        mark = state.today()
+        if since is None:
+            print("[INFO] Nessun high-water mark: harvest completo")
+            total = self.fetch_all(query, from_year, to_year, sink=sink)
+            state.set("zenodo", query, mark)
+            return total
+
+        print(f"\n[INFO] Fetch delta: record aggiornati da {since}")
+        delta_query = f"({query}) AND updated:[{since} TO *]"
+        # chiave (anno, record) come in iter_records: deduplicazione per anno, non sull'intervallo
+        new = {}
+        seen = 0
+        for item in self.iter_hits(delta_query, sort="updated-desc"):
+            key, record = self.parse_hit(item)
+            if record["year"] in range(from_year, to_year + 1):
+                new.setdefault((record["year"], key), record)
+                seen += 1
+        METRICS.add_records("zenodo", len(new), duplicates=seen - len(new))
+
+        total = 0
         for y in range(from_year, to_year + 1):
-            all_records.extend(self.fetch_year(query, y))
-        print(f"\n[INFO] Totale record {from_year}-{to_year}: {len(all_records)}")
-        return all_records
+            delta = [r for r in new.values() if r["year"] == y]
+            path = self.year_path(y) + ".csv"
+            if delta:
+                total += self.drain(iter_merged_csv(path, delta, self.record_key), sink)
+            elif sink is not None:
+                total += sink.write_all(iter_csv_records(path))
+            else:
+                total += sum(1 for _ in iter_csv_records(path))  # file invariato
+
+        state.set("zenodo", query, mark)
+        print(f"\n[INFO] Nuovi/aggiornati: {len(new)}, totale {from_year}-{to_year}: {total}")
+        return total
+
+    def record_key(self, record):
+        return record.get("doi") or record.get("url")
+
+    # ================= ALL YEARS =================
+    def save_all_years(self, from_year, to_year, base="output-zenodo/zenodo_all_years",
+                       parquet_root=None, store=None):
+        """
+        Concatena in streaming i file per anno (in ordine di anno) nel file complessivo.
+        parquet_root: scrive anche il dataset Parquet partizionato per anno (serve pyarrow).
+        store: CorpusStore in cui fare upsert dei record.
+        """
+        with TeeSink(self.file_sink(base), *parquet_sinks("zenodo", parquet_root),
+                     *store_sinks("zenodo", store)) as sink:
+            total = sum(sink.write_all(iter_csv_records(self.year_path(y) + ".csv"))
+                        for y in range(from_year, to_year + 1))
+        print(f"[INFO] {base}: {total} record")
+        return total
 
     # ================= SAVE CSV =================
     def save_csv(self, records, path):
-        if not records:
-            return
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", newline="", encoding="utf-8-sig") as f:
-            writer = csv.DictWriter(f, fieldnames=records[0].keys())
-            writer.writeheader()
-            writer.writerows(records)
+        with CsvSink(path, flush_every=self.per_page) as sink:
+            sink.write_all(records)
 
     # ================= SAVE BIBTEX =================
-    def save_bibtex(self, records, path):
-        if not records:
-            return
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", encoding="utf-8") as f:
-            for i, r in enumerate(records, 1):
-                f.write(
+    def bibtex_entry(self, r, i):
+        entry = (
 f"""@misc{{zenodo{i},
   title  = {{{r['title']}}},
   author = {{{r['authors']}}},
   year   = {{{r['year']}}},
   url    = {{{r['url']}}},
 """
-                )
-                if r["doi"]:
-                    f.write(f"  doi    = {{{r['doi']}}},\n")
-                f.write("}\n\n")
+        )
+        if r["doi"]:
+            entry += f"  doi    = {{{r['doi']}}},\n"
+        return entry + "}\n\n"
+
+    def save_bibtex(self, records, path):
+        with BibtexSink(path, self.bibtex_entry, flush_every=self.per_page) as sink:
+            sink.write_all(records)
 
 
-# ================= MAIN =================
-if __name__ == "__main__":
+# ================= HARVEST =================
+# token-zenodo.env sta nella radice del repository, accanto a Fetcher-Functions
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN_PATH = os.path.join(REPO_DIR, "token-zenodo.env")
+
+
+def harvest(cache=None, store_path=STORE_PATH, parquet_root=PARQUET_ROOT,
+            from_year=2015, to_year=2026, sharded=False, delta=True):
+    """
+    Run completa Zenodo: file per anno, file complessivo, Parquet e archivio del corpus.
+    sharded=True per query ampie che superano la finestra di paginazione;
+    delta=True: solo i record aggiornati dall'ultima run, uniti ai file esistenti.
+    Restituisce il numero di record del file complessivo.
+    """
     os.makedirs("output-zenodo", exist_ok=True)
 
     cloud_terms = [
@@ -172,16 +402,30 @@ if __name__ == "__main__":
         "iot"
     ]
 
-    token_path = r"C:\Users\maria\Desktop\Cloud-Ontology\token-zenodo.env"
-
-    zf = ZenodoFetcher(token_path=token_path)
+    zf = ZenodoFetcher(token_path=TOKEN_PATH, cache=cache or ResponseCache(".http-cache"),
+                       journal_dir="output-zenodo/journal")
 
     query = zf.build_query(cloud_terms, semantic_terms, exclude_terms)
     print("[INFO] Query Zenodo:", query)
 
-    records = zf.fetch_all(query, from_year=2015, to_year=2026)
+    # i record vengono scritti nei file per anno man mano che arrivano
+    if sharded:
+        zf.fetch_all_sharded(query, from_year=from_year, to_year=to_year, workers=4)
+    elif delta:
+        zf.fetch_delta(query, from_year=from_year, to_year=to_year,
+                       state=HarvestState("output-zenodo/harvest-state.json"))
+    else:
+        zf.fetch_all(query, from_year=from_year, to_year=to_year)
+
+    store = CorpusStore(store_path)
+    total = zf.save_all_years(from_year=from_year, to_year=to_year,
+                              parquet_root=parquet_root, store=store)
+    store.close()
+    zf.finish_journals()
+    return total
 
-    zf.save_csv(records, "output-zenodo/zenodo_all_years.csv")
-    zf.save_bibtex(records, "output-zenodo/zenodo_all_years.bib")
 
-    print("[OK] Estrazione Zenodo completata")
\ No newline at end of file
+# ================= MAIN =================
+if __name__ == "__main__":
+    harvest()
+    print("[OK] Estrazione Zenodo completata")
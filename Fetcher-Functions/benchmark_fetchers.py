@@ -0,0 +1,193 @@
+import argparse
+import json
+import sys
+import time
+from datetime import date
+
+from harvest_metrics import METRICS
+from replay_server import SCENARIOS, RecordingClient, ReplayClient, ReplayServer, SyntheticCorpus
+
+SOURCES = ["zenodo", "scopus", "github", "lodcloud"]
+
+CLOUD_TERMS = ["cloud computing", "cloud-computing", "multi-cloud"]
+SEMANTIC_TERMS = ["ontolog*", "semantic web", "knowledge graph*", "linked data", "linked open data"]
+EXCLUDE_TERMS = ["internet of things", "iot"]
+
+
+# attese dei fetcher (backoff, rate_limit, pause) dalle loro metriche:
+# la latenza simulata dal server non è un'attesa del client
+def client_waits(source):
+    """Secondi di attesa per motivo, sommati su tutti i thread."""
+    return dict(METRICS.summary()["sources"].get(source, {}).get("sleep_s", {}))
+
+
+def longest_thread_wait(before, after):
+    """Attesa del thread più bloccato tra due istantanee di METRICS.sleep_by_thread: mai oltre la durata."""
+    return max((seconds - before.get(thread, 0.0) for thread, seconds in after.items()), default=0.0)
+
+
+class CountSink:
+    """Sink che conta e scarta: si misura il fetch, non la scrittura su disco."""
+
+    def __init__(self):
+        self.count = 0
+
+    def write_all(self, records):
+        n = sum(1 for _ in records)
+        self.count += n
+        return n
+
+
+# ================= HARVEST PER SORGENTE =================
+# make_client(**opzioni del client del fetcher) -> HttpClient (replay o registrazione)
+def run_zenodo(make_client, sharded=False):
+    from Zenodo_fetcher import ZenodoFetcher
+    zf = ZenodoFetcher(client=make_client(source="zenodo", max_retries=3))
+    query = zf.build_query(CLOUD_TERMS, ["ontology", "semantic web"], EXCLUDE_TERMS)
+    sink = CountSink()
+    if sharded:
+        zf.fetch_all_sharded(query, from_year=2015, to_year=2026, workers=4, sink=sink)
+    else:
+        zf.fetch_all(query, from_year=2015, to_year=2026, sink=sink)
+    return sink.count
+
+
+def run_scopus(make_client, api_key="offline"):
+    from Scopus_fetcher import ScopusFetcher
+    fetcher = ScopusFetcher(api_key, client=make_client(source="scopus", max_retries=3))
+    query = fetcher.build_query('TITLE-ABS-KEY ( "cloud computing" AND "ontolog*" )',
+                                start_year=2014, end_year=2026)
+    return sum(1 for _ in fetcher.iter_all(query, concurrent=True, workers=4, requests_per_second=5))
+
+
+def run_github(make_client, tokens=None):
+    from github_multifetcher_filtered import GitHubFetcher
+    from github_query_planner import GitHubQueryPlanner
+    tokens = tokens or [None]
+    client = make_client(source="github", retry_statuses=(500, 502, 503, 504), retry_forbidden=False,
+                         per_host_limit=max(4, len(tokens)))
+    fetcher = GitHubFetcher(tokens=tokens, client=client)
+    planner = GitHubQueryPlanner(fetcher)
+    results = planner.fetch(['"cloud computing"', '"multi-cloud"'], ['"ontology"', '"linked data"'],
+                            ['"internet of things"'], qualifiers="in:name,description",
+                            start=date(2014, 1, 2), end=date(2026, 12, 31))
+    return len(results)
+
+
+def run_lodcloud(make_client):
+    from LodCloud_fetcher import LodCloudFetcher
+    fetcher = LodCloudFetcher(client=make_client(source="lodcloud", max_retries=3, backoff_base=2))
+    return len(fetcher.fetch(CLOUD_TERMS, SEMANTIC_TERMS, EXCLUDE_TERMS,
+                             year_min=2014, year_max=2026, streaming=True))
+
+
+RUNNERS = {"zenodo": run_zenodo, "scopus": run_scopus, "github": run_github, "lodcloud": run_lodcloud}
+
+
+# ================= BENCHMARK =================
+def bench_source(server, source, **options):
+    server.reset_stats()
+    before, before_threads = client_waits(source), METRICS.sleep_by_thread(source)
+    start = time.perf_counter()
+    records = RUNNERS[source](lambda **kw: ReplayClient(server.url, **kw), **options)
+    elapsed = time.perf_counter() - start
+    waits = {reason: round(seconds - before.get(reason, 0.0), 3)
+             for reason, seconds in client_waits(source).items()}
+    wait = longest_thread_wait(before_threads, METRICS.sleep_by_thread(source))
+    stats = dict(server.stats[source])
+    return {
+        "source": source,
+        "records": records,
+        "seconds": round(elapsed, 3),
+        "requests": stats["requests"],
+        "requests_per_s": round(stats["requests"] / elapsed, 2) if elapsed else 0.0,
+        "records_per_s": round(records / elapsed, 2) if elapsed else 0.0,
+        "wait_s": round(wait, 3),
+        "wait_by_reason": waits,  # sommate sui worker
+        "throttled": stats["throttled"],
+        "errors": stats["errors"],
+        "bytes": stats["bytes"],
+    }
+
+
+def run_benchmarks(sources=SOURCES, scenario="clean", records=None, cassette=None, sharded=False):
+    corpus = SyntheticCorpus(records)
+    results = []
+    with ReplayServer(SCENARIOS[scenario], corpus=corpus, cassette=cassette) as server:
+        for source in sources:
+            options = {"sharded": True} if source == "zenodo" and sharded else {}
+            print(f"\n[INFO] Benchmark {source} (scenario {scenario})")
+            results.append(bench_source(server, source, **options))
+    return results
+
+
+def print_table(results):
+    header = f"{'source':<9} {'records':>8} {'req':>6} {'sec':>8} {'req/s':>8} {'rec/s':>9} {'wait s':>8} {'429/403':>8} {'5xx':>5}"
+    print("\n" + header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['source']:<9} {r['records']:>8} {r['requests']:>6} {r['seconds']:>8.2f} "
+              f"{r['requests_per_s']:>8.2f} {r['records_per_s']:>9.2f} {r['wait_s']:>8.2f} "
+              f"{r['throttled']:>8} {r['errors']:>5}")
+
+
+def compare(results, baseline_path, tolerance):
+    """Regressioni rispetto a un report salvato: record diversi o rec/s sotto (1 - tolerance)."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["source"]: r for r in json.load(f)["results"]}
+    failures = []
+    for r in results:
+        base = baseline.get(r["source"])
+        if not base:
+            continue
+        if r["records"] != base["records"]:
+            failures.append(f"{r['source']}: {r['records']} record (baseline {base['records']})")
+        if r["records_per_s"] < base["records_per_s"] * (1 - tolerance):
+            failures.append(f"{r['source']}: {r['records_per_s']} rec/s "
+                            f"(baseline {base['records_per_s']}, tolleranza {tolerance:.0%})")
+    return failures
+
+
+def record(sources, cassette):
+    """Esegue i fetcher contro le API reali registrando le risposte (servono token / API key)."""
+    from Scopus_fetcher import load_api_key
+    make_client = lambda **kw: RecordingClient(cassette, **kw)
+    for source in sources:
+        print(f"\n[INFO] Registrazione {source} -> {cassette}")
+        options = {"api_key": load_api_key()} if source == "scopus" else {}
+        n = RUNNERS[source](make_client, **options)
+        print(f"[INFO] {source}: {n} record registrati")
+
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline dei fetcher sul replay server")
+    parser.add_argument("--sources", default=",".join(SOURCES))
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="clean")
+    parser.add_argument("--records", type=int, help="record sintetici per sorgente (default: per sorgente)")
+    parser.add_argument("--sharded", action="store_true", help="Zenodo con fetch_all_sharded")
+    parser.add_argument("--cassette", help="risposte registrate da servire al posto di quelle sintetiche")
+    parser.add_argument("--record", metavar="CASSETTE", help="registra le API reali invece di misurare")
+    parser.add_argument("--json", help="salva il report in questo file")
+    parser.add_argument("--baseline", help="report JSON di riferimento: esce con 1 se c'è una regressione")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args()
+
+    sources = [s.strip() for s in args.sources.split(",") if s.strip()]
+    if args.record:
+        record(sources, args.record)
+        sys.exit(0)
+
+    records = {s: args.records for s in sources} if args.records else None
+    results = run_benchmarks(sources, args.scenario, records, args.cassette, args.sharded)
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"scenario": args.scenario, "results": results}, f, indent=2)
+        print(f"[INFO] Report salvato in {args.json}")
+    if args.baseline:
+        failures = compare(results, args.baseline, args.tolerance)
+        for failure in failures:
+            print(f"[WARN] Regressione: {failure}")
+        sys.exit(1 if failures else 0)
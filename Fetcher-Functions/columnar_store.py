@@ -0,0 +1,218 @@
+import os
+import re
+import shutil
+import sys
+from datetime import date, datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+    import pyarrow.parquet as pq
+except ImportError:  # dipendenza opzionale: senza pyarrow restano solo CSV / BibTeX
+    pa = None
+
+# accanto a Fetcher-Functions come le altre cartelle output-*, qualunque sia la cartella di lavoro
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output-parquet")
+
+# colonne tipizzate per sorgente; tutte le altre sono stringhe
+COLUMN_TYPES = {
+    "zenodo": {"year": "year"},
+    "scopus": {"year": "date", "references": "int32", "citations": "int32"},
+    "github": {"created": "timestamp", "updated": "timestamp", "stars": "int32"},
+    "lodcloud": {"created": "year"},
+}
+
+# campo da cui si ricava la partizione pub_year (0 = anno sconosciuto)
+YEAR_FIELDS = {"zenodo": "year", "scopus": "year", "github": "created", "lodcloud": "created"}
+
+YEAR = re.compile(r"(?:19|20)\d\d")
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("pyarrow non installato: pip install pyarrow per l'output Parquet")
+
+
+def arrow_type(name):
+    return {"year": pa.int16(), "int32": pa.int32(), "date": pa.date32(),
+            "timestamp": pa.timestamp("s", tz="UTC")}.get(name, pa.string())
+
+
+def convert(value, kind):
+    """Valore da record / riga CSV al tipo della colonna (None se vuoto o non valido)."""
+    if value is None or value == "":
+        return None
+    if kind == "year":
+        m = YEAR.search(str(value))
+        return int(m.group(0)) if m else None
+    if kind == "int32":
+        try:
+            return int(str(value).strip())
+        except ValueError:
+            return None
+    if kind == "date":
+        try:
+            return date.fromisoformat(str(value)[:10])
+        except ValueError:
+            return None
+    if kind == "timestamp":
+        try:
+            return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(v) for v in value)
+    return str(value)
+
+
+def partition_year(source, record):
+    m = YEAR.search(str(record.get(YEAR_FIELDS.get(source, "year")) or ""))
+    return int(m.group(0)) if m else 0
+
+
+class ParquetSink:
+    """
+    Sink Parquet partizionato: <root>/source=<sorgente>/pub_year=<anno>/part-0.parquet
+    - Colonne tipizzate (COLUMN_TYPES), schema fissato dal primo record
+    - Buffer per partizione, scritto come row group ogni batch_size record
+    - La partizione della sorgente viene costruita a parte e sostituita in blocco a close();
+      abort() la scarta lasciando intatta la versione precedente
+    """
+
+    def __init__(self, source, root=DEFAULT_ROOT, batch_size=5000, row=None):
+        require_pyarrow()
+        self.row = row  # eventuale trasformazione record -> riga (come CsvSink)
+        self.source = source
+        self.root = root
+        self.final_dir = os.path.join(root, f"source={source}")
+        self.tmp_dir = os.path.join(root, f".source={source}.part")
+        self.batch_size = batch_size
+        self.types = COLUMN_TYPES.get(source, {})
+        self.schema = None
+        self.buffers = {}
+        self.writers = {}
+        self.count = 0
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def make_schema(self, record):
+        return pa.schema([(name, arrow_type(self.types.get(name))) for name in record])
+
+    # ================= WRITE =================
+    def write(self, record):
+        if self.row:
+            record = self.row(record)
+        if self.schema is None:
+            self.schema = self.make_schema(record)
+        year = partition_year(self.source, record)
+        buf = self.buffers.setdefault(year, [])
+        buf.append({name: convert(record.get(name), self.types.get(name)) for name in self.schema.names})
+        self.count += 1
+        if len(buf) >= self.batch_size:
+            self.write_batch(year)
+
+    def write_all(self, records):
+        n = 0
+        for record in records:
+            self.write(record)
+            n += 1
+        self.flush()
+        return n
+
+    def write_batch(self, year):
+        rows = self.buffers.pop(year, None)
+        if not rows:
+            return
+        if year not in self.writers:
+            part_dir = os.path.join(self.tmp_dir, f"pub_year={year}")
+            os.makedirs(part_dir, exist_ok=True)
+            self.writers[year] = pq.ParquetWriter(os.path.join(part_dir, "part-0.parquet"),
+                                                  self.schema, compression="zstd")
+        self.writers[year].write_table(pa.Table.from_pylist(rows, schema=self.schema))
+
+    def flush(self):
+        for year in list(self.buffers):
+            self.write_batch(year)
+
+    # ================= FINALIZE =================
+    def close(self):
+        if not self.count:
+            return False
+        self.flush()
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+        old = self.final_dir + ".old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.isdir(self.final_dir):
+            os.replace(self.final_dir, old)
+        os.replace(self.tmp_dir, self.final_dir)
+        shutil.rmtree(old, ignore_errors=True)
+        return True
+
+    def abort(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+        self.buffers = {}
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+# ================= READ =================
+def source_dataset(source, root=DEFAULT_ROOT):
+    require_pyarrow()
+    path = os.path.join(root, f"source={source}")
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Nessun dataset Parquet per {source} in {root}")
+    return pads.dataset(path, format="parquet", partitioning="hive")
+
+
+def read_source(source, root=DEFAULT_ROOT, columns=None, years=None):
+    """
+    DataFrame pandas di una sorgente: legge solo le colonne richieste
+    e solo le partizioni pub_year in `years` (None = tutte).
+    """
+    dataset = source_dataset(source, root)
+    flt = pads.field("pub_year").isin(list(years)) if years is not None else None
+    return dataset.to_table(columns=columns, filter=flt).to_pandas()
+
+
+def available(source, root=DEFAULT_ROOT):
+    return pa is not None and os.path.isdir(os.path.join(root, f"source={source}"))
+
+
+def parquet_sinks(source, root=DEFAULT_ROOT, **kwargs):
+    """[ParquetSink] se pyarrow è installato e root è dato, altrimenti []: da aggiungere a un TeeSink."""
+    if root is None or pa is None:
+        return []
+    return [ParquetSink(source, root, **kwargs)]
+
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    # conversione una tantum dei CSV esistenti: python columnar_store.py [root]
+    from harvest_state import iter_csv_records
+
+    root = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_ROOT
+    inputs = {
+        "zenodo": "output-zenodo/zenodo_all_years.csv",
+        "scopus": "output-scopus/scopus_cloud.csv",
+        "github": "output-github/github_results.csv",
+        "lodcloud": "output-lodcloud/lodcloud_results.csv",
+    }
+    for source, path in inputs.items():
+        if not os.path.isfile(path):
+            print(f"[WARN] {path} non trovato, sorgente {source} saltata")
+            continue
+        with ParquetSink(source, root) as sink:
+            n = sink.write_all(iter_csv_records(path))
+        print(f"[INFO] {source}: {n} record -> {sink.final_dir}")
@@ -0,0 +1,332 @@
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+from harvest_state import iter_csv_records
+from record_merge import CANONICAL_FIELDS, DEFAULT_INPUTS, normalize_key, to_canonical
+
+# accanto a Fetcher-Functions (dove lo apre anche il converter), qualunque sia la cartella di lavoro
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus.sqlite")
+DECISIONS = ("include", "exclude", "maybe")
+
+# chiave stabile di un record per sorgente (la stessa usata dai merge dei fetcher)
+RECORD_KEYS = {
+    "scopus": lambda r: r.get("eid") or r.get("scopus_id"),
+    "zenodo": lambda r: r.get("doi") or r.get("url"),
+    "github": lambda r: r.get("url"),
+    "lodcloud": lambda r: r.get("url"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    record_key TEXT NOT NULL,
+    title TEXT, authors TEXT, year INTEGER, abstract TEXT, keywords TEXT,
+    doi TEXT, url TEXT, venue TEXT, type TEXT,
+    raw TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    UNIQUE (source, record_key)
+);
+CREATE INDEX IF NOT EXISTS idx_records_doi ON records(doi);
+CREATE INDEX IF NOT EXISTS idx_records_url ON records(url);
+CREATE INDEX IF NOT EXISTS idx_records_year ON records(year);
+CREATE INDEX IF NOT EXISTS idx_records_source ON records(source);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+    title, abstract, keywords,
+    content='records', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS records_ai AFTER INSERT ON records BEGIN
+    INSERT INTO records_fts(rowid, title, abstract, keywords)
+    VALUES (new.id, new.title, new.abstract, new.keywords);
+END;
+CREATE TRIGGER IF NOT EXISTS records_ad AFTER DELETE ON records BEGIN
+    INSERT INTO records_fts(records_fts, rowid, title, abstract, keywords)
+    VALUES ('delete', old.id, old.title, old.abstract, old.keywords);
+END;
+CREATE TRIGGER IF NOT EXISTS records_au AFTER UPDATE OF title, abstract, keywords ON records BEGIN
+    INSERT INTO records_fts(records_fts, rowid, title, abstract, keywords)
+    VALUES ('delete', old.id, old.title, old.abstract, old.keywords);
+    INSERT INTO records_fts(rowid, title, abstract, keywords)
+    VALUES (new.id, new.title, new.abstract, new.keywords);
+END;
+
+CREATE TABLE IF NOT EXISTS screening (
+    record_id INTEGER PRIMARY KEY REFERENCES records(id) ON DELETE CASCADE,
+    decision TEXT NOT NULL CHECK (decision IN ('include', 'exclude', 'maybe')),
+    reason TEXT,
+    reviewer TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_screening_decision ON screening(decision);
+"""
+
+# upsert in due passi: INSERT che ignora le chiavi già presenti (changes() dice se la riga è nuova),
+# poi UPDATE delle sole righe esistenti
+INSERT = f"""
+INSERT INTO records (source, record_key, {", ".join(CANONICAL_FIELDS)}, raw, first_seen, last_seen)
+VALUES (?, ?, {", ".join("?" for _ in CANONICAL_FIELDS)}, ?, ?, ?)
+ON CONFLICT (source, record_key) DO NOTHING
+"""
+UPDATE = f"""
+UPDATE records SET {", ".join(f"{f} = ?" for f in CANONICAL_FIELDS)}, raw = ?, last_seen = ?
+WHERE source = ? AND record_key = ?
+"""
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class CorpusStore:
+    """
+    Archivio SQLite del corpus, dietro i fetcher e il converter.
+    - Un record per (sorgente, chiave): la chiave è quella dei merge dei fetcher,
+      e il vincolo UNIQUE (source, record_key) fa da indice di deduplicazione tra una run e l'altra
+    - Colonne indicizzate: DOI, URL, anno, sorgente
+    - Indice FTS5 (title, abstract, keywords) sincronizzato da trigger, ricerca ordinata per bm25
+    - Upsert in blocco in un'unica transazione
+    - Decisioni di screening (include / exclude / maybe) separate dai record:
+      un nuovo harvest non le sovrascrive
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)  # più harvest in parallelo sullo stesso file
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # ================= UPSERT =================
+    def record_key(self, source, raw, record):
+        key_fn = RECORD_KEYS.get(source)
+        key = key_fn(raw) if key_fn else None
+        return key or record["doi"] or record["url"] or normalize_key(record["title"])
+
+    def upsert(self, source, records, fields=None):
+        """
+        Inserisce / aggiorna un blocco di record grezzi della sorgente in una transazione.
+        fields: mappa dei campi come in record_merge (default: SOURCE_FIELDS[source]).
+        Restituisce (nuovi, aggiornati).
+        """
+        stamp = now()
+        rows = []
+        for raw in records:
+            record = to_canonical(source, raw, fields)
+            key = self.record_key(source, raw, record)
+            if not key:
+                continue
+            values = [record[f] or None for f in CANONICAL_FIELDS]
+            values[CANONICAL_FIELDS.index("year")] = int(record["year"]) if record["year"] else None
+            rows.append((source, key, *values, json.dumps(raw, ensure_ascii=False, default=str),
+                         stamp, stamp))
+        added = 0
+        with self.conn:
+            # i conteggi restano nella transazione: corretti anche con altri harvest sullo stesso file
+            for row in rows:
+                if self.conn.execute(INSERT, row).rowcount:
+                    added += 1
+                else:
+                    # row = (source, key, *campi, raw, first_seen, last_seen)
+                    self.conn.execute(UPDATE, (*row[2:-2], stamp, source, row[1]))
+        return added, len(rows) - added
+
+    def count(self, source=None):
+        if source:
+            return self.conn.execute("SELECT COUNT(*) FROM records WHERE source = ?", (source,)).fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    # ================= LOOKUP =================
+    def lookup(self, doi=None, url=None):
+        """Record con lo stesso DOI o URL, su tutte le sorgenti."""
+        clauses, params = [], []
+        if doi:
+            clauses.append("doi = ?")
+            params.append(doi.strip().lower())
+        if url:
+            clauses.append("url = ?")
+            params.append(url.strip())
+        if not clauses:
+            return []
+        return self.conn.execute(f"SELECT * FROM records WHERE {' OR '.join(clauses)}", params).fetchall()
+
+    # ================= SEARCH =================
+    def search(self, query, limit=50, sources=None, years=None, decision=None):
+        """
+        Ricerca full-text FTS5 (sintassi FTS5: "frasi", prefix*, AND / OR / NOT),
+        ordinata per bm25 con il titolo pesato più dell'abstract.
+        """
+        sql = ["SELECT r.id, r.source, r.year, r.title, r.doi, r.url, s.decision,",
+               "bm25(records_fts, 10.0, 1.0, 3.0) AS score",
+               "FROM records_fts JOIN records r ON r.id = records_fts.rowid",
+               "LEFT JOIN screening s ON s.record_id = r.id",
+               "WHERE records_fts MATCH ?"]
+        params = [query]
+        if sources:
+            sql.append(f"AND r.source IN ({', '.join('?' for _ in sources)})")
+            params += list(sources)
+        if years:
+            sql.append("AND r.year BETWEEN ? AND ?")
+            params += [min(years), max(years)]
+        if decision == "pending":
+            sql.append("AND s.decision IS NULL")
+        elif decision:
+            sql.append("AND s.decision = ?")
+            params.append(decision)
+        sql.append("ORDER BY score LIMIT ?")
+        params.append(limit)
+        return self.conn.execute(" ".join(sql), params).fetchall()
+
+    # ================= SCREENING =================
+    def set_decision(self, record_ids, decision, reason="", reviewer="", overwrite=True):
+        """
+        overwrite=False: scrive solo sui record senza decisione, quelle già prese
+        (es. da un revisore) restano com'erano. Restituisce le decisioni scritte.
+        """
+        if decision not in DECISIONS:
+            raise ValueError(f"Decisione non valida: {decision} (attese: {', '.join(DECISIONS)})")
+        if isinstance(record_ids, int):
+            record_ids = [record_ids]
+        stamp = now()
+        conflict = ("DO UPDATE SET decision = excluded.decision, reason = excluded.reason, "
+                    "reviewer = excluded.reviewer, updated_at = excluded.updated_at"
+                    if overwrite else "DO NOTHING")
+        with self.conn:
+            cur = self.conn.executemany(
+                f"""INSERT INTO screening (record_id, decision, reason, reviewer, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (record_id) {conflict}""",
+                [(i, decision, reason, reviewer, stamp) for i in record_ids])
+        return cur.rowcount
+
+    def ids_for_keys(self, source, keys):
+        ids = []
+        for key in keys:
+            row = self.conn.execute("SELECT id FROM records WHERE source = ? AND record_key = ?",
+                                    (source, key)).fetchone()
+            if row:
+                ids.append(row[0])
+        return ids
+
+    def screening_summary(self):
+        rows = self.conn.execute(
+            "SELECT COALESCE(s.decision, 'pending') AS d, COUNT(*) FROM records r "
+            "LEFT JOIN screening s ON s.record_id = r.id GROUP BY d").fetchall()
+        return {d: n for d, n in rows}
+
+    def export_screening(self, path):
+        rows = self.conn.execute(
+            "SELECT r.id, r.source, r.year, r.title, r.authors, r.doi, r.url, "
+            "s.decision, s.reason, s.reviewer, s.updated_at FROM records r "
+            "JOIN screening s ON s.record_id = r.id ORDER BY r.id").fetchall()
+        with open(path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(rows[0].keys() if rows else ["id"])
+            writer.writerows(tuple(r) for r in rows)
+        print(f"[INFO] Decisioni di screening esportate: {len(rows)} -> {path}")
+
+
+class StoreSink:
+    """Sink (interfaccia di record_sinks) che fa upsert nell'archivio a blocchi di batch_size."""
+
+    def __init__(self, store, source, fields=None, batch_size=500, row=None):
+        self.store = store
+        self.row = row  # eventuale trasformazione record -> riga (come CsvSink)
+        self.source = source
+        self.fields = fields
+        self.batch_size = batch_size
+        self.batch = []
+        self.count = 0
+        self.added = self.updated = 0
+
+    def write(self, record):
+        self.batch.append(self.row(record) if self.row else record)
+        self.count += 1
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def write_all(self, records):
+        n = 0
+        for record in records:
+            self.write(record)
+            n += 1
+        self.flush()
+        return n
+
+    def flush(self):
+        if self.batch:
+            added, updated = self.store.upsert(self.source, self.batch, self.fields)
+            self.added += added
+            self.updated += updated
+            self.batch = []
+
+    def close(self):
+        self.flush()
+        if self.count:
+            print(f"[INFO] Archivio {self.store.path} ({self.source}): "
+                  f"{self.added} nuovi, {self.updated} aggiornati")
+        return bool(self.count)
+
+    def abort(self):
+        # i blocchi già scritti sono transazioni concluse: si scarta solo quello in corso
+        self.batch = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def store_sinks(source, store=None, **kwargs):
+    """[StoreSink] se è dato un archivio, altrimenti []: da aggiungere a un TeeSink."""
+    return [StoreSink(store, source, **kwargs)] if store is not None else []
+
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    # uso:
+    #   python corpus_store.py load                      carica i CSV dei fetcher
+    #   python corpus_store.py search "<query FTS5>"     ricerca ordinata
+    #   python corpus_store.py decide <id,...> <include|exclude|maybe> [motivo]
+    #   python corpus_store.py export <file.csv>         decisioni di screening
+    store = CorpusStore()
+    command = sys.argv[1] if len(sys.argv) > 1 else "load"
+
+    if command == "load":
+        for source, path in DEFAULT_INPUTS.items():
+            if not os.path.isfile(path):
+                print(f"[WARN] {path} non trovato, sorgente {source} saltata")
+                continue
+            with StoreSink(store, source) as sink:
+                sink.write_all(iter_csv_records(path))
+        print(f"[INFO] Record in archivio: {store.count()} | screening: {store.screening_summary()}")
+    elif command == "search":
+        t = time.perf_counter()
+        rows = store.search(sys.argv[2])
+        ms = (time.perf_counter() - t) * 1000
+        for r in rows:
+            print(f"{r['id']:>6} {r['source']:<8} {r['year'] or '':<4} {r['decision'] or '-':<7} {r['title'][:90]}")
+        print(f"[INFO] {len(rows)} risultati in {ms:.1f} ms")
+    elif command == "decide":
+        ids = [int(i) for i in sys.argv[2].split(",")]
+        store.set_decision(ids, sys.argv[3], reason=" ".join(sys.argv[4:]))
+        print(f"[INFO] Screening: {store.screening_summary()}")
+    elif command == "export":
+        store.export_screening(sys.argv[2])
+    store.close()
@@ -0,0 +1,311 @@
+import glob
+import os
+import re
+import sys
+import unicodedata
+
+# export del replication package nella radice del repository, qualunque sia la cartella di lavoro
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET_DIR = os.path.join(REPO_DIR, "Replication package", "Dataset-Articoli")
+CHUNK_SIZE = 64 * 1024
+
+# ================= LATEX =================
+LATEX_ACCENTS = {
+    '"': "̈", "'": "́", "`": "̀", "^": "̂", "~": "̃", "=": "̄",
+    ".": "̇", "u": "̆", "v": "̌", "H": "̋", "c": "̧", "k": "̨",
+}
+RE_ACCENT = re.compile(r"""\{?\\([\"'`^~=.uvHck])\s*\{?\\?([A-Za-z])\}?\}?""")
+RE_ESCAPED = re.compile(r"\\([&%_$#{}])")
+RE_SPACES = re.compile(r"\s+")
+
+
+def latex_to_text(value):
+    """Accenti LaTeX -> Unicode, caratteri escaped, graffe di protezione rimosse."""
+    if "\\" in value:
+        value = RE_ACCENT.sub(lambda m: m.group(2) + LATEX_ACCENTS[m.group(1)], value)
+        value = RE_ESCAPED.sub(lambda m: "\x00" + m.group(1), value)
+    value = value.replace("{", "").replace("}", "").replace("\x00", "")
+    return unicodedata.normalize("NFC", RE_SPACES.sub(" ", value)).strip()
+
+
+def display_name(name):
+    """"Cognome, Nome" -> "Nome Cognome"; gli altri formati restano invariati."""
+    name = name.strip()
+    if name.count(",") == 1:
+        last, first = (p.strip() for p in name.split(","))
+        return f"{first} {last}".strip()
+    return name
+
+
+def first_year(*values):
+    for v in values:
+        m = re.search(r"(?:19|20)\d\d", v or "")
+        if m:
+            return m.group(0)
+    return ""
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    # newline=None: CR, LF e CRLF (gli export IEEE li mescolano) diventano "\n"
+    with open(path, "r", encoding="utf-8-sig", errors="replace", newline=None) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+# ================= BIBTEX =================
+RE_ENTRY_START = re.compile(r"@\s*(\w+)\s*([{(])")
+RE_PARTIAL_START = re.compile(r"@\s*\w*\s*\Z")
+RE_BRACES = re.compile(r"[{})]")
+RE_FIELD_NAME = re.compile(r"\s*,?\s*([\w:.+/-]+)\s*=\s*")
+
+
+def iter_bibtex_entries(chunks):
+    """
+    Scansione incrementale: restituisce (tipo, corpo) per ogni voce @tipo{...}.
+    In memoria resta solo la voce corrente; le graffe annidate e le voci
+    che iniziano a metà riga (export IEEE: "},}@INPROCEEDINGS{") sono gestite.
+    """
+    buf = ""
+    current = None  # (tipo, delimitatore, inizio del corpo) della voce in corso
+    scan = depth = 0
+    for chunk in chunks:
+        buf += chunk
+        pos = 0
+        while True:
+            if current is None:
+                at = buf.find("@", pos)
+                if at < 0:
+                    pos = len(buf)
+                    break
+                m = RE_ENTRY_START.match(buf, at)
+                if m is None:
+                    if RE_PARTIAL_START.match(buf, at):
+                        pos = at  # intestazione spezzata tra due chunk
+                        break
+                    pos = at + 1
+                    continue
+                current = (m.group(1).lower(), m.group(2), m.end())
+                scan, depth = m.end(), 1
+
+            entry_type, opener, body_start = current
+            end = None
+            for b in RE_BRACES.finditer(buf, scan):
+                ch = b.group(0)
+                if ch == "{":
+                    depth += 1
+                elif ch == "}":
+                    depth -= 1
+                    if depth == 0 and opener == "{":
+                        end = b.start()
+                        break
+                elif ch == ")" and opener == "(" and depth == 1:
+                    end = b.start()
+                    break
+            if end is None:
+                scan = len(buf)  # voce incompleta: si continua con il prossimo chunk
+                break
+
+            yield entry_type, buf[body_start:end]
+            current, pos = None, end + 1
+
+        # scarta quanto già consumato
+        keep = current[2] if current else pos
+        buf = buf[keep:]
+        if current:
+            scan -= keep
+            current = (current[0], current[1], 0)
+
+
+def parse_bibtex_value(body, pos, strings):
+    """Valore a partire da pos: {…}, "…", numero o macro, concatenati con #."""
+    parts = []
+    while True:
+        while pos < len(body) and body[pos].isspace():
+            pos += 1
+        if pos >= len(body):
+            break
+        ch = body[pos]
+        if ch == "{":
+            depth, i = 0, pos
+            while i < len(body):
+                if body[i] == "{":
+                    depth += 1
+                elif body[i] == "}":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                i += 1
+            parts.append(body[pos + 1:i])
+            pos = i + 1
+        elif ch == '"':
+            depth, i = 0, pos + 1
+            while i < len(body) and not (body[i] == '"' and depth == 0):
+                depth += {"{": 1, "}": -1}.get(body[i], 0)
+                i += 1
+            parts.append(body[pos + 1:i])
+            pos = i + 1
+        else:
+            m = re.match(r"[^\s,#]+", body[pos:])
+            if not m:
+                break
+            token = m.group(0)
+            parts.append(strings.get(token.lower(), token))
+            pos += len(token)
+        while pos < len(body) and body[pos].isspace():
+            pos += 1
+        if pos < len(body) and body[pos] == "#":
+            pos += 1
+            continue
+        break
+    return "".join(parts), pos
+
+
+def parse_bibtex_body(body, strings=None):
+    """Corpo di una voce -> (chiave, {campo: valore grezzo})."""
+    strings = strings or {}
+    key, _, rest = body.partition(",")
+    if "=" in key:  # voce senza chiave
+        key, rest = "", body
+    fields = {}
+    pos = 0
+    while True:
+        m = RE_FIELD_NAME.match(rest, pos)
+        if not m:
+            break
+        value, pos = parse_bibtex_value(rest, m.end(), strings)
+        fields[m.group(1).lower()] = value
+    return key.strip(), fields
+
+
+def bibtex_to_record(entry_type, key, fields):
+    f = {k: latex_to_text(v) for k, v in fields.items()}
+    authors = [display_name(a) for a in re.split(r"\s+and\s+", f.get("author", "")) if a.strip()]
+    keywords = [k.strip() for k in re.split(r"[;,]", f.get("keywords", "")) if k.strip()]
+    doi = f.get("doi", "")
+    return {
+        "title": f.get("title", ""),
+        "authors": ", ".join(authors),
+        "abstract": f.get("abstract", ""),
+        "year": first_year(f.get("year"), f.get("date")),
+        "keywords": ", ".join(keywords),
+        "doi": doi,
+        "url": f.get("url") or (f"https://doi.org/{doi}" if doi else ""),
+        "type": entry_type,
+        "venue": f.get("journal") or f.get("booktitle") or f.get("publisher", ""),
+        "key": key,
+    }
+
+
+def iter_bibtex(path):
+    """Record stile fetcher, uno alla volta, da un file BibTeX."""
+    strings = {}
+    for entry_type, body in iter_bibtex_entries(read_chunks(path)):
+        if entry_type in ("comment", "preamble"):
+            continue
+        if entry_type == "string":
+            _, defs = parse_bibtex_body("," + body)
+            strings.update({k: latex_to_text(v) for k, v in defs.items()})
+            continue
+        key, fields = parse_bibtex_body(body, strings)
+        yield bibtex_to_record(entry_type, key, fields)
+
+
+# ================= RIS =================
+RE_RIS_LINE = re.compile(r"^([A-Z][A-Z0-9])  -(?: (.*))?$")
+RIS_TYPES = {"JOUR": "article", "CONF": "inproceedings", "CPAPER": "inproceedings",
+             "BOOK": "book", "CHAP": "incollection", "THES": "phdthesis", "RPRT": "techreport"}
+
+
+def iter_ris_entries(chunks):
+    """Scansione riga per riga: {tag: [valori]} per ogni record TY … ER."""
+    entry, last, pending = {}, None, ""
+    for chunk in chunks:
+        lines = (pending + chunk).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            m = RE_RIS_LINE.match(line.rstrip())
+            if m:
+                tag, value = m.group(1), (m.group(2) or "").strip()
+                if tag == "ER":
+                    if entry:
+                        yield entry
+                    entry, last = {}, None
+                    continue
+                entry.setdefault(tag, []).append(value)
+                last = tag
+            elif last and line.strip():
+                # campo su più righe: continua il valore precedente
+                entry[last][-1] = (entry[last][-1] + " " + line.strip()).strip()
+    if pending.strip():
+        m = RE_RIS_LINE.match(pending.rstrip())
+        if m and m.group(1) != "ER":
+            entry.setdefault(m.group(1), []).append((m.group(2) or "").strip())
+    if entry:
+        yield entry
+
+
+def ris_to_record(entry):
+    def first(*tags):
+        for t in tags:
+            for v in entry.get(t, ()):
+                if v:
+                    return v
+        return ""
+
+    authors = [display_name(a) for t in ("AU", "A1") for a in entry.get(t, ()) if a]
+    ris_type = first("TY")
+    return {
+        "title": first("TI", "T1"),
+        "authors": ", ".join(authors),
+        "abstract": first("AB", "N2"),
+        "year": first_year(first("PY"), first("Y1"), first("DA")),
+        "keywords": ", ".join(k for k in entry.get("KW", ()) if k),
+        "doi": first("DO"),
+        "url": first("UR") or (f"https://doi.org/{first('DO')}" if first("DO") else ""),
+        "type": RIS_TYPES.get(ris_type, ris_type.lower()),
+        "venue": first("T2", "JO", "JF", "J2"),
+        "key": first("ID", "AN"),
+    }
+
+
+def iter_ris(path):
+    """Record stile fetcher, uno alla volta, da un file RIS."""
+    for entry in iter_ris_entries(read_chunks(path)):
+        yield ris_to_record(entry)
+
+
+# ================= DISPATCH =================
+def iter_export(path):
+    return iter_ris(path) if path.lower().endswith(".ris") else iter_bibtex(path)
+
+
+def count_bibtex_entries(path):
+    return sum(1 for t, _ in iter_bibtex_entries(read_chunks(path))
+               if t not in ("comment", "preamble", "string"))
+
+
+def dataset_exports(directory=DATASET_DIR):
+    """
+    Export del replication package per sorgente. Per le coppie IEEE .bib/.ris
+    basta un formato: si usa il .bib (nomi completi degli autori) se contiene voci.
+    """
+    ieee = []
+    for bib in sorted(glob.glob(os.path.join(directory, "IEEE-*.bib"))):
+        ris = bib[:-4] + ".ris"
+        ieee.append(bib if count_bibtex_entries(bib) or not os.path.isfile(ris) else ris)
+    return {
+        "ieee": ieee,
+        "acm": sorted(glob.glob(os.path.join(directory, "ACM*.bib"))),
+        "scopus": sorted(glob.glob(os.path.join(directory, "Scopus*.ris"))),
+    }
+
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    paths = sys.argv[1:] or [p for ps in dataset_exports().values() for p in ps]
+    for path in paths:
+        n = sum(1 for _ in iter_export(path))
+        print(f"[INFO] {path}: {n} record")
@@ -1,129 +1,231 @@
 import os
+import threading
 import requests
-import csv
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 from dotenv import load_dotenv
-import time
+from http_client import HttpClient
+from http_cache import ResponseCache
+from harvest_state import HarvestState, iter_merged_csv
+from harvest_journal import PageFetchError, open_journal
+from harvest_metrics import METRICS
+from rate_limiter import AdaptiveRateLimiter
+from github_query_planner import GitHubQueryPlanner
+from record_sinks import BibtexSink, CsvSink, TeeSink
+from columnar_store import DEFAULT_ROOT as PARQUET_ROOT, parquet_sinks
+from corpus_store import DEFAULT_PATH as STORE_PATH, CorpusStore, store_sinks
 
 class GitHubFetcher:
-    def __init__(self, token=None):
+    # GitHub restituisce al più 1000 risultati per ricerca
+    search_cap = 1000
+    CSV_FIELDS = ['title', 'author', 'description', 'created', 'updated',
+                  'language', 'stars', 'url', 'license']
+
+    def __init__(self, token=None, client=None, limiter=None, tokens=None, cache=None,
+                 journal_dir=None):
+        """
+        token: singolo token GitHub
+        tokens: pool di token; ognuno ha il proprio rate limiter e le
+        richieste vengono distribuite sul token disponibile per primo
+        journal_dir: journal delle pagine completate (ripresa dopo un crash)
+        """
         self.base_url = "https://api.github.com/search/repositories"
-        self.headers = {}
-        if token:
-            self.headers['Authorization'] = f'token {token}'
+        tokens = list(tokens or ([token] if token else [None]))
+        self.slots = []
+        for i, t in enumerate(tokens):
+            headers = {'Authorization': f'token {t}'} if t else {}
+            slot_limiter = limiter if (limiter and i == 0) else AdaptiveRateLimiter()
+            self.slots.append((headers, slot_limiter))
+        self.slot_lock = threading.Lock()
+        self.headers, self.limiter = self.slots[0]
+        # 403/429 di rate limit li gestisce il limiter, non il retry del client
+        self.http = client or HttpClient(retry_statuses=(500, 502, 503, 504), retry_forbidden=False,
+                                         per_host_limit=max(4, len(self.slots)), cache=cache,
+                                         source="github")
+        self.journal_dir = journal_dir
+        self.journals = []
+
+    @property
+    def waited(self):
+        return sum(limiter.waited for _, limiter in self.slots)
+
+    def pick_slot(self):
+        with self.slot_lock:
+            return min(self.slots, key=lambda slot: slot[1].delay())
+
+    # --- Una singola richiesta di ricerca, con rate limit
+    def search(self, query, page=1, per_page=100):
+        params = {
+            'q': query,
+            'per_page': per_page,
+            'page': page
+        }
+        while True:
+            headers, limiter = self.pick_slot()
+            # il limiter si consuma solo per le richieste che vanno in rete, non per i hit di cache
+            acquire = lambda: METRICS.add_sleep("github", limiter.acquire(), "rate_limit")
+            try:
+                response = self.http.get(self.base_url, headers=headers, params=params,
+                                         before_fetch=acquire)
+            except requests.exceptions.RequestException as e:
+                raise PageFetchError(f"GitHub pagina {page}: {e}") from e
+
+            # --- 🔹 Rate limit guidato dagli header (X-RateLimit-*, Retry-After)
+            if limiter.update(response):
+                continue  # ripete la richiesta; l'attesa la fa il limiter
+
+            if response.status_code != 200:
+                raise Exception(f"Errore API GitHub: {response.status_code} - {response.text}")
+            return response
+
+    def count_results(self, query):
+        return self.search(query, per_page=1).json().get("total_count", 0)
+
+    def parse_item(self, item):
+        return {
+            'title': item.get('name'),
+            'author': item.get('owner', {}).get('login'),
+            'description': item.get('description'),
+            'created': item.get('created_at'),
+            'updated': item.get('updated_at'),
+            'language': item.get('language'),
+            'stars': item.get('stargazers_count'),
+            'url': item.get('html_url'),
+            'license': item.get('license', {}).get('name') if item.get('license') else None
+        }
 
     def fetch_repositories(self, query, max_results=100):
+        """max_results=None: tutte le pagine fino al tetto di search_cap risultati."""
         print(f"[INFO] Eseguo query: {query}")
         all_results = []
         page = 1
 
-        while len(all_results) < max_results:
-            params = {
-                'q': query,
-                'per_page': 100,
-                'page': page
-            }
-            response = requests.get(self.base_url, headers=self.headers, params=params)
-
-            # --- 🔹 Gestione automatica del rate limit
-            if response.status_code == 403 and "rate limit" in response.text.lower():
-                reset_time = response.headers.get('X-RateLimit-Reset')
-                if reset_time:
-                    reset_timestamp = datetime.fromtimestamp(int(reset_time))
-                    wait_seconds = max(0, (reset_timestamp - datetime.utcnow()).seconds) + 5
-                    print(f"[WARN] Limite API raggiunto — attendo {wait_seconds} secondi fino a {reset_timestamp}...")
-                    time.sleep(wait_seconds)
-                else:
-                    print("[WARN] Limite API raggiunto — attendo 60 secondi...")
-                    time.sleep(60)
-                continue  # ripete la richiesta dopo l’attesa
-
-            if response.status_code != 200:
-                raise Exception(f"Errore API GitHub: {response.status_code} - {response.text}")
+        journal = self.journal_for(query)
+        if journal:
+            done, page = journal.resume(1, 1)
+            for _, records in done:
+                all_results.extend(records)
+            if done and (len(done[-1][1]) < 100 or (page - 1) * 100 >= self.search_cap):
+                page = None  # query già completata
 
+        while page and (max_results is None or len(all_results) < max_results):
+            response = self.search(query, page)
             data = response.json()
             items = data.get("items", [])
+            records = [self.parse_item(item) for item in items]
+            if journal:
+                journal.record(page, records)
             if not items:
                 break
 
-            for item in items:
-                all_results.append({
-                    'title': item.get('name'),
-                    'author': item.get('owner', {}).get('login'),
-                    'description': item.get('description'),
-                    'created': item.get('created_at'),
-                    'updated': item.get('updated_at'),
-                    'language': item.get('language'),
-                    'stars': item.get('stargazers_count'),
-                    'url': item.get('html_url'),
-                    'license': item.get('license', {}).get('name') if item.get('license') else None
-                })
+            all_results.extend(records)
 
             # --- 🔹 Informazioni sul rate limit
             remaining = response.headers.get('X-RateLimit-Remaining')
             print(f"[INFO] Pagina {page} completata ({len(items)} risultati). Limite residuo: {remaining}")
 
-            # --- 🔹 Pausa di sicurezza tra le richieste
-            time.sleep(3)
-
-            if len(items) < 100:
+            if len(items) < 100 or page * 100 >= self.search_cap:
                 break
             page += 1
 
-        print(f"[INFO] Trovati {len(all_results)} risultati per la query")
+        print(f"[INFO] Trovati {len(all_results)} risultati per la query "
+              f"(attesa rate limit totale: {self.waited:.1f}s)")
         return all_results
 
+    def journal_for(self, query):
+        journal = open_journal(self.journal_dir, "github", query)
+        if journal:
+            self.journals.append(journal)
+        return journal
+
+    def finish_journals(self):
+        """Da chiamare quando gli output finali sono stati salvati."""
+        for journal in self.journals:
+            journal.finish()
+        self.journals = []
+
+    def fetch_many(self, queries, max_results=None):
+        """Esegue più query in parallelo, un worker per token del pool."""
+        with ThreadPoolExecutor(max_workers=len(self.slots)) as pool:
+            return list(pool.map(lambda q: self.fetch_repositories(q, max_results), queries))
+
+    def report(self):
+        return [limiter.report() for _, limiter in self.slots]
+
+
+    def output_sink(self, csv_filename, bib_filename, parquet_root=None, store=None):
+        """
+        CSV + BibTeX scritti in streaming, resi definitivi solo a fine scrittura.
+        parquet_root: anche il dataset Parquet partizionato per anno (serve pyarrow).
+        store: CorpusStore in cui fare upsert dei record.
+        """
+        return TeeSink(CsvSink(csv_filename, fieldnames=self.CSV_FIELDS),
+                       BibtexSink(bib_filename, self.bib_entry),
+                       *parquet_sinks("github", parquet_root),
+                       *store_sinks("github", store))
 
     def save_as_csv(self, data, filename):
-        if not data:
+        with CsvSink(filename, fieldnames=self.CSV_FIELDS) as sink:
+            sink.write_all(data)
+        if sink.count:
+            print(f"[INFO] File CSV salvato come '{filename}'")
+        else:
             print("[WARN] Nessun dato da salvare.")
-            return
-        with open(filename, mode='w', newline='', encoding='utf-8-sig') as csvfile:
-            fieldnames = ['title', 'author', 'description', 'created', 'updated',
-                          'language', 'stars', 'url', 'license']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(data)
-        print(f"[INFO] File CSV salvato come '{filename}'")
+
+    def bib_entry(self, rec, i):
+        key = f"github{i}"
+        title = rec.get('title', '')
+        author = rec.get('author', '')
+        year = ''
+        if rec.get('created'):
+            try:
+                year = datetime.strptime(rec['created'], '%Y-%m-%dT%H:%M:%SZ').year
+            except Exception:
+                pass
+        url = rec.get('url', '')
+        note = f"Language: {rec.get('language', '')}, Stars: {rec.get('stars', '')}, License: {rec.get('license', '')}"
+        return f"@misc{{{key}, title={{{title}}}, author={{{author}}}, year={{{year}}}, howpublished={{\\url{{{url}}}}}, note={{{note}}}}}\n\n"
 
     def save_as_bib(self, data, filename):
-        if not data:
+        with BibtexSink(filename, self.bib_entry) as sink:
+            sink.write_all(data)
+        if sink.count:
+            print(f"[INFO] File BibTeX salvato come '{filename}'")
+        else:
             print("[WARN] Nessun dato da salvare.")
-            return
-        with open(filename, 'w', encoding='utf-8') as f:
-            for i, rec in enumerate(data):
-                key = f"github{i+1}"
-                title = rec.get('title', '')
-                author = rec.get('author', '')
-                year = ''
-                if rec.get('created'):
-                    try:
-                        year = datetime.strptime(rec['created'], '%Y-%m-%dT%H:%M:%SZ').year
-                    except Exception:
-                        pass
-                url = rec.get('url', '')
-                note = f"Language: {rec.get('language', '')}, Stars: {rec.get('stars', '')}, License: {rec.get('license', '')}"
-                f.write(f"@misc{{{key}, title={{{title}}}, author={{{author}}}, year={{{year}}}, howpublished={{\\url{{{url}}}}}, note={{{note}}}}}\n\n")
-        print(f"[INFO] File BibTeX salvato come '{filename}'")
 
-# ==================== MAIN =============================
-if __name__ == "__main__":
+# ==================== HARVEST ==========================
+# token.env sta nella radice del repository, accanto a Fetcher-Functions
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN_PATH = os.path.join(REPO_DIR, "token.env")
+
+
+def harvest(output_dir="output-github", cache=None, store_path=STORE_PATH, parquet_root=PARQUET_ROOT):
+    """
+    Run completa GitHub: ricerca pianificata (delta da pushed:), CSV, BibTeX, Parquet e archivio.
+    Restituisce il numero di repository salvate.
+    """
     # --- Cartella output dedicata
-    output_dir = r"C:\Users\maria\Desktop\Cloud-Ontology\fetcher-Functions\output-github"
     os.makedirs(output_dir, exist_ok=True)
 
     # --- Caricamento token
-    load_dotenv(r"C:\Users\maria\Desktop\Cloud-Ontology\token.env")
-    github_token = os.getenv("GITHUB_TOKEN")
-    if not github_token:
+    load_dotenv(TOKEN_PATH)
+    # GITHUB_TOKENS=tok1,tok2,... per un pool di token, altrimenti GITHUB_TOKEN
+    github_tokens = [t.strip() for t in os.getenv("GITHUB_TOKENS", "").split(",") if t.strip()]
+    if not github_tokens and os.getenv("GITHUB_TOKEN"):
+        github_tokens = [os.getenv("GITHUB_TOKEN")]
+    if not github_tokens:
         raise ValueError("⚠️ Token GitHub non trovato. Verifica token.env")
 
-    github_fetcher = GitHubFetcher(token=github_token)
+    github_fetcher = GitHubFetcher(tokens=github_tokens, cache=cache or ResponseCache(".http-cache"),
+                                   journal_dir=os.path.join(output_dir, "journal"))
+    print(f"[INFO] Token GitHub nel pool: {len(github_tokens)}")
 
-    # --- Controllo rate limit ---
-    check = requests.get(
+    # --- Controllo rate limit (mai dalla cache: deve essere la quota attuale) ---
+    check = github_fetcher.http.get(
         "https://api.github.com/rate_limit",
-        headers={'Authorization': f'token {github_token}'}
+        headers=github_fetcher.headers,
+        use_cache=False
     )
     if check.status_code == 200:
         limits = check.json().get('resources', {}).get('search', {})
@@ -137,33 +239,44 @@ if __name__ == "__main__":
     ]
     exclusions = ['"internet of things"', 'iot']
 
-    # --- Creazione query ---
-    queries = []
-    for c in keywords_cloud:
-        for o in keywords_ontology:
-            q = (f'{c} {o} NOT ({" OR ".join(exclusions)}) '
-                 'in:name,description '
-                 'created:>2014-01-01 created:<2027-01-01 '
-                 'language:English')
-            queries.append(q)
-
-    # --- Recupero risultati ---
-    all_results = []
-    for q in queries:
-        results = github_fetcher.fetch_repositories(query=q, max_results=200)
-        all_results.extend(results)
-
-    # --- Deduplicazione ---
-    seen = set()
-    unique_results = []
-    for r in all_results:
-        if r['url'] not in seen:
-            unique_results.append(r)
-            seen.add(r['url'])
-
-    # --- Salvataggio ---
-    github_fetcher.save_as_csv(unique_results, os.path.join(output_dir, "github_results.csv"))
-    github_fetcher.save_as_bib(unique_results, os.path.join(output_dir, "github_results.bib"))
+    # --- Delta: solo repository aggiornate (pushed:) dall'ultima run ---
+    csv_path = os.path.join(output_dir, "github_results.csv")
+    qualifiers = 'in:name,description language:English'
+    state = HarvestState(os.path.join(output_dir, "harvest-state.json"))
+    state_query = " ".join(keywords_cloud + keywords_ontology + exclusions) + " " + qualifiers
+    since = state.get("github", state_query)
+    mark = state.today()
+    if since:
+        print(f"[INFO] Fetch delta: repository aggiornate da {since}")
+        qualifiers += f" pushed:>={since}"
+
+    # --- Pianificazione query (OR-accorpamento + slicing su created:) e recupero ---
+    planner = GitHubQueryPlanner(github_fetcher)
+    unique_results = planner.fetch(
+        keywords_cloud, keywords_ontology, exclusions,
+        qualifiers=qualifiers,
+        start=date(2014, 1, 2), end=date(2026, 12, 31),
+    )
+    if since:
+        # il CSV esistente viene letto riga per riga mentre si scrive il nuovo
+        unique_results = iter_merged_csv(csv_path, unique_results, lambda r: r['url'])
+
+    # --- Salvataggio (streaming, file sostituiti solo a scrittura completata) ---
+    store = CorpusStore(store_path)
+    with github_fetcher.output_sink(csv_path, os.path.join(output_dir, "github_results.bib"),
+                                    parquet_root, store) as sink:
+        saved = sink.write_all(unique_results)
+    store.close()
+
+    state.set("github", state_query, mark)
+    github_fetcher.finish_journals()
 
     # --- Info finale ---
-    print(f"[INFO] Totale repository uniche salvate: {len(unique_results)}")
+    print(f"[INFO] Totale repository uniche salvate: {saved}")
+    print(f"[INFO] Rate limiter: {github_fetcher.report()}")
+    return saved
+
+
+# ==================== MAIN =============================
+if __name__ == "__main__":
+    harvest()
@@ -0,0 +1,103 @@
+from datetime import date, timedelta
+
+from harvest_metrics import METRICS
+
+
+class GitHubQueryPlanner:
+    """
+    Pianificatore di query GitHub.
+    - Accorpa i termini in OR-query: il minor numero di query che rispetta
+      i limiti di GitHub (lunghezza e numero di operatori AND/OR/NOT)
+    - Se total_count supera il tetto di ricerca (1000), divide ricorsivamente la query
+      su intervalli created:a..b finché ogni intervallo è scaricabile per intero
+    - Deduplicazione su URL
+    """
+
+    def __init__(self, fetcher, max_length=256, max_operators=5):
+        self.fetcher = fetcher
+        self.max_length = max_length
+        self.max_operators = max_operators
+
+    # ================= TERMS =================
+    def group(self, terms):
+        if len(terms) == 1:
+            return terms[0]
+        return "(" + " OR ".join(terms) + ")"
+
+    def chunks(self, terms, size):
+        return [terms[i:i + size] for i in range(0, len(terms), size)]
+
+    def exclusion(self, exclusions):
+        if not exclusions:
+            return "", 0
+        return f"NOT {self.group(exclusions)}", len(exclusions)
+
+    def plan_terms(self, cloud_terms, semantic_terms, exclusions):
+        """
+        Sceglie le dimensioni dei gruppi OR (cloud × semantic) che
+        minimizzano il numero di query rispettando i limiti.
+        """
+        not_part, not_ops = self.exclusion(exclusions)
+        best = None
+
+        for a in range(1, len(cloud_terms) + 1):
+            for b in range(1, len(semantic_terms) + 1):
+                if (a - 1) + (b - 1) + not_ops > self.max_operators:
+                    continue
+                queries = [
+                    " ".join(p for p in (self.group(c), self.group(s), not_part) if p)
+                    for c in self.chunks(cloud_terms, a)
+                    for s in self.chunks(semantic_terms, b)
+                ]
+                if any(len(q) > self.max_length for q in queries):
+                    continue
+                if best is None or len(queries) < len(best):
+                    best = queries
+
+        if best is None:
+            raise ValueError("Nessuna combinazione di termini rispetta i limiti di GitHub")
+        return best
+
+    # ================= DATE SLICING =================
+    def slice_dates(self, query, start, end):
+        """Restituisce [(query con created:start..end, total_count)] entro il tetto di ricerca."""
+        q = f"{query} created:{start.isoformat()}..{end.isoformat()}"
+        total = self.fetcher.count_results(q)
+        if total == 0:
+            return []
+        if total <= self.fetcher.search_cap:
+            return [(q, total)]
+        if start >= end:
+            print(f"[WARN] {total} risultati il {start}: oltre {self.fetcher.search_cap} non recuperabili")
+            return [(q, total)]
+
+        mid = start + timedelta(days=(end - start).days // 2)
+        return (self.slice_dates(query, start, mid)
+                + self.slice_dates(query, mid + timedelta(days=1), end))
+
+    def plan(self, cloud_terms, semantic_terms, exclusions, qualifiers, start, end):
+        planned = []
+        for terms in self.plan_terms(cloud_terms, semantic_terms, exclusions):
+            query = f"{terms} {qualifiers}".strip()
+            planned.extend(self.slice_dates(query, start, end))
+        print(f"[INFO] Query pianificate: {len(planned)} "
+              f"(prodotto cartesiano: {len(cloud_terms) * len(semantic_terms)})")
+        return planned
+
+    # ================= FETCH =================
+    def fetch(self, cloud_terms, semantic_terms, exclusions, qualifiers="",
+              start=date(2015, 1, 1), end=date(2026, 12, 31)):
+        planned = self.plan(cloud_terms, semantic_terms, exclusions, qualifiers, start, end)
+        fetched = self.fetcher.fetch_many([query for query, _ in planned])
+
+        unique = {}
+        fetched_total = 0
+        for (query, total), results in zip(planned, fetched):
+            if len(results) < min(total, self.fetcher.search_cap):
+                print(f"[WARN] Recuperati {len(results)}/{total} risultati per: {query}")
+            fetched_total += len(results)
+            for r in results:
+                unique.setdefault(r['url'], r)
+        METRICS.add_records("github", len(unique), duplicates=fetched_total - len(unique))
+        return list(unique.values())
+
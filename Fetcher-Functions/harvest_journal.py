@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import threading
+
+
+class PageFetchError(RuntimeError):
+    """Una pagina non è stata scaricata nemmeno dopo tutti i retry."""
+
+
+class PageJournal:
+    """
+    Journal append-only (JSONL) delle pagine completate di una query.
+    - Una riga per pagina: cursore (pagina / offset) + record + metadati
+    - Scritto con flush + fsync: sopravvive a un crash a metà run
+    - Alla ripartenza la run riprende dall'ultimo cursore valido
+    - Una riga troncata dal crash viene ignorata
+    """
+
+    def __init__(self, directory, source, key):
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(directory, f"{source}-{digest}.jsonl")
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.meta = {}
+        self.load()
+
+    def load(self):
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self.pages[entry["cursor"]] = entry["records"]
+                self.meta[entry["cursor"]] = entry.get("meta", {})
+        if self.pages:
+            print(f"[INFO] Journal {self.path}: {len(self.pages)} pagine già scaricate")
+
+    def record(self, cursor, records, **meta):
+        line = json.dumps({"cursor": cursor, "records": records, "meta": meta},
+                          ensure_ascii=False, default=str)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.pages[cursor] = records
+            self.meta[cursor] = meta
+
+    def resume(self, first, step):
+        """
+        Pagine contigue già nel journal a partire da `first` (passo `step`).
+        Restituisce (lista di (cursore, record), prossimo cursore da scaricare).
+        """
+        done = []
+        cursor = first
+        while cursor in self.pages:
+            done.append((cursor, self.pages[cursor]))
+            cursor += step
+        return done, cursor
+
+    def finish(self):
+        """Da chiamare quando gli output finali sono su disco."""
+        with self.lock:
+            if os.path.isfile(self.path):
+                os.remove(self.path)
+            self.pages = {}
+            self.meta = {}
+
+
+def open_journal(directory, source, key):
+    return PageJournal(directory, source, key) if directory else None
@@ -0,0 +1,201 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# limiti superiori (secondi) dell'istogramma delle latenze, come i bucket Prometheus
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_atomic(path, text):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".part"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class SourceMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.statuses = {}
+        self.latencies = []
+        self.bytes = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.sleep = {}
+        self.thread_sleep = {}  # attesa per thread: con più worker la somma supera il tempo reale
+        self.records = 0
+        self.duplicates = 0
+
+
+class Metrics:
+    """
+    Metriche della run di harvest, condivise da client HTTP, fetcher e pipeline.
+    - Per sorgente: richieste (per status), latenza, byte, retry, hit di cache,
+      secondi di attesa per motivo (backoff, rate_limit, pause), record prodotti e duplicati scartati
+    - Per stage della pipeline: durata ed esito
+    - Export: report JSON della run e textfile Prometheus (node_exporter textfile collector)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.sources = {}
+            self.stages = {}
+
+    def source(self, name):
+        # chiamato con il lock
+        if name not in self.sources:
+            self.sources[name] = SourceMetrics()
+        return self.sources[name]
+
+    # ================= RECORD =================
+    def observe_request(self, source, status, seconds, size=0, retry=False):
+        """Un tentativo HTTP: status (int o "error"), latenza, byte ricevuti, se è un retry."""
+        with self.lock:
+            m = self.source(source)
+            m.requests += 1
+            m.statuses[str(status)] = m.statuses.get(str(status), 0) + 1
+            m.latencies.append(seconds)
+            m.bytes += size
+            m.retries += 1 if retry else 0
+
+    def cache_hit(self, source):
+        with self.lock:
+            self.source(source).cache_hits += 1
+
+    def add_sleep(self, source, seconds, reason):
+        if seconds <= 0:
+            return
+        thread = threading.get_ident()
+        with self.lock:
+            m = self.source(source)
+            m.sleep[reason] = m.sleep.get(reason, 0.0) + seconds
+            m.thread_sleep[thread] = m.thread_sleep.get(thread, 0.0) + seconds
+
+    def sleep(self, source, seconds, reason):
+        """time.sleep che registra l'attesa."""
+        time.sleep(seconds)
+        self.add_sleep(source, seconds, reason)
+
+    def sleep_by_thread(self, source):
+        """{thread: secondi di attesa} della sorgente."""
+        with self.lock:
+            return dict(self.source(source).thread_sleep)
+
+    def add_records(self, source, n=1, duplicates=0):
+        with self.lock:
+            m = self.source(source)
+            m.records += n
+            m.duplicates += duplicates
+
+    def observe_stage(self, name, seconds, status):
+        with self.lock:
+            self.stages[name] = {"seconds": round(seconds, 3), "status": status}
+
+    # ================= REPORT =================
+    def summary(self):
+        with self.lock:
+            sources = {}
+            for name, m in sorted(self.sources.items()):
+                sources[name] = {
+                    "requests": m.requests,
+                    "statuses": dict(sorted(m.statuses.items())),
+                    "latency_s": {
+                        "total": round(sum(m.latencies), 3),
+                        "p50": round(percentile(m.latencies, 0.5), 3),
+                        "p95": round(percentile(m.latencies, 0.95), 3),
+                        "max": round(max(m.latencies, default=0.0), 3),
+                    },
+                    "bytes": m.bytes,
+                    "retries": m.retries,
+                    "cache_hits": m.cache_hits,
+                    "sleep_s": {k: round(v, 3) for k, v in sorted(m.sleep.items())},
+                    "records": m.records,
+                    "duplicates_dropped": m.duplicates,
+                }
+            return {
+                "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(timespec="seconds"),
+                "duration_s": round(time.time() - self.started, 3),
+                "sources": sources,
+                "stages": dict(self.stages),
+            }
+
+    def write_json(self, path):
+        write_atomic(path, json.dumps(self.summary(), indent=2) + "\n")
+        print(f"[INFO] Report della run: {path}")
+
+    def prometheus(self):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{escape_label(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        with self.lock:
+            items = sorted(self.sources.items())
+            metric("harvest_http_requests_total", "counter", "Tentativi HTTP per sorgente e status.",
+                   [({"source": s, "status": st}, n) for s, m in items for st, n in sorted(m.statuses.items())])
+
+            lines.append("# HELP harvest_http_request_duration_seconds Latenza dei tentativi HTTP.")
+            lines.append("# TYPE harvest_http_request_duration_seconds histogram")
+            for s, m in items:
+                label = escape_label(s)
+                for bound in LATENCY_BUCKETS:
+                    n = sum(1 for x in m.latencies if x <= bound)
+                    lines.append(f'harvest_http_request_duration_seconds_bucket{{source="{label}",le="{bound}"}} {n}')
+                lines.append(f'harvest_http_request_duration_seconds_bucket{{source="{label}",le="+Inf"}} {len(m.latencies)}')
+                lines.append(f'harvest_http_request_duration_seconds_sum{{source="{label}"}} {sum(m.latencies):.6f}')
+                lines.append(f'harvest_http_request_duration_seconds_count{{source="{label}"}} {len(m.latencies)}')
+
+            metric("harvest_http_response_bytes_total", "counter", "Byte ricevuti.",
+                   [({"source": s}, m.bytes) for s, m in items])
+            metric("harvest_http_retries_total", "counter", "Tentativi ripetuti dopo errore o rate limit.",
+                   [({"source": s}, m.retries) for s, m in items])
+            metric("harvest_http_cache_hits_total", "counter", "Risposte servite dalla cache su disco.",
+                   [({"source": s}, m.cache_hits) for s, m in items])
+            metric("harvest_sleep_seconds_total", "counter", "Secondi di attesa per motivo.",
+                   [({"source": s, "reason": r}, f"{v:.3f}") for s, m in items for r, v in sorted(m.sleep.items())])
+            metric("harvest_records_total", "counter", "Record prodotti dai fetcher.",
+                   [({"source": s}, m.records) for s, m in items])
+            metric("harvest_duplicates_dropped_total", "counter", "Record scartati come duplicati.",
+                   [({"source": s}, m.duplicates) for s, m in items])
+
+            stages = sorted(self.stages.items())
+            metric("harvest_stage_duration_seconds", "gauge", "Durata degli stage della pipeline.",
+                   [({"stage": n, "status": st["status"]}, st["seconds"]) for n, st in stages])
+            metric("harvest_stage_success", "gauge", "1 se lo stage è andato a buon fine.",
+                   [({"stage": n}, int(st["status"] == "ok")) for n, st in stages])
+            metric("harvest_run_start_timestamp_seconds", "gauge", "Inizio della run (epoch).",
+                   [({}, f"{self.started:.0f}")])
+            metric("harvest_run_duration_seconds", "gauge", "Durata della run.",
+                   [({}, f"{time.time() - self.started:.3f}")])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # scrittura atomica: il textfile collector non legge mai un file a metà
+        write_atomic(path, self.prometheus())
+        print(f"[INFO] Metriche Prometheus: {path}")
+
+
+METRICS = Metrics()
@@ -0,0 +1,93 @@
+import csv
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+csv.field_size_limit(50 * 1024 * 1024)
+
+
+class HarvestState:
+    """
+    High-water mark per sorgente e query, persistiti in un file JSON.
+    - Il mark è la data (UTC) di inizio dell'ultimo harvest completato
+    - La run successiva chiede solo i record creati/aggiornati da quella data
+      (sovrapposizione di un giorno: i doppioni li assorbe merge_csv)
+    """
+
+    def __init__(self, path="harvest-state.json"):
+        self.path = path
+        self.state = {}
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def key(self, source, query):
+        return f"{source}:{hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]}"
+
+    def get(self, source, query):
+        entry = self.state.get(self.key(source, query))
+        return entry["mark"] if entry else None
+
+    def set(self, source, query, mark):
+        self.state[self.key(source, query)] = {"source": source, "query": query, "mark": mark}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def today():
+        return datetime.now(timezone.utc).date().isoformat()
+
+
+def iter_csv_records(path):
+    if not os.path.isfile(path):
+        return
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+def read_csv_records(path):
+    return list(iter_csv_records(path))
+
+
+def iter_merged_csv(path, records, key):
+    """
+    Unisce i nuovi record a quelli già salvati in `path` (CSV), in streaming:
+    il file è letto riga per riga, in memoria restano solo i record nuovi.
+    A parità di chiave vince il record nuovo; l'ordine esistente è preservato,
+    i record con chiavi nuove seguono in fondo.
+    I record senza chiave (né DOI né URL) non si possono confrontare: passano tutti.
+    """
+    new = {}
+    unkeyed = []
+    for r in records:
+        k = key(r)
+        if k:
+            new[k] = r
+        else:
+            unkeyed.append(r)
+    seen = set()
+    updated = 0
+    for row in iter_csv_records(path):
+        k = key(row)
+        if not k:
+            yield row
+            continue
+        if k in seen:
+            continue
+        seen.add(k)
+        if k in new:
+            updated += 1
+            yield new.pop(k)
+        else:
+            yield row
+    print(f"[INFO] Merge {path}: {len(new) + len(unkeyed)} nuovi, {updated} aggiornati")
+    yield from new.values()
+    yield from unkeyed
+
+
+def merge_csv(path, records, key):
+    """Come iter_merged_csv, ma restituisce la lista completa."""
+    return list(iter_merged_csv(path, records, key))
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# TTL di default per sorgente (secondi)
+DEFAULT_TTLS = {
+    "zenodo.org": 6 * 3600,
+    "api.elsevier.com": 24 * 3600,
+    "api.github.com": 3600,
+    "lod-cloud.net": 7 * 24 * 3600,  # catalogo versionato: cambia di rado
+}
+
+
+class ResponseCache:
+    """
+    Cache su disco delle risposte HTTP (GET 200), sotto HttpClient.
+    - Chiave: URL + parametri
+    - TTL per sorgente (host); scaduto il TTL si rivalida con ETag / If-Modified-Since
+    - Eviction LRU quando la dimensione totale supera max_bytes
+    """
+
+    def __init__(self, directory=".http-cache", ttls=None, default_ttl=3600,
+                 max_bytes=500 * 1024 * 1024):
+        self.directory = directory
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total_bytes = None  # calcolato alla prima scrittura
+        os.makedirs(directory, exist_ok=True)
+
+    # ================= KEYS =================
+    def key(self, url, params=None):
+        full = url + ("?" + urlencode(sorted((params or {}).items()), doseq=True) if params else "")
+        return hashlib.sha256(full.encode("utf-8")).hexdigest()
+
+    def paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + ".json", base + ".body"
+
+    def ttl(self, url):
+        return self.ttls.get(urlsplit(url).hostname, self.default_ttl)
+
+    # ================= LOOKUP =================
+    def lookup(self, url, params=None):
+        """Restituisce (meta, body_path) oppure None."""
+        meta_path, body_path = self.paths(self.key(url, params))
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(body_path):
+            return None
+        os.utime(meta_path)  # LRU: ultimo accesso
+        return meta, body_path
+
+    def is_fresh(self, url, meta):
+        return time.time() - meta["stored_at"] < self.ttl(url)
+
+    def conditional_headers(self, meta):
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def to_response(self, meta, body_path):
+        r = requests.Response()
+        r.status_code = meta["status"]
+        r.headers = CaseInsensitiveDict(meta["headers"])
+        r.url = meta["url"]
+        r.encoding = meta.get("encoding")
+        with open(body_path, "rb") as f:
+            r._content = f.read()
+        r.from_cache = True
+        return r
+
+    # ================= STORE =================
+    def response_meta(self, response):
+        meta = {
+            "url": response.url,
+            "status": response.status_code,
+            "headers": dict(response.headers),
+            "encoding": response.encoding,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "stored_at": time.time(),
+        }
+        # il corpo è già decompresso: non va ripresentato come gzip;
+        # gli header di rate limit non devono alimentare i limiter a cache calda
+        for name in list(meta["headers"]):
+            lname = name.lower()
+            if lname in ("content-encoding", "content-length", "retry-after") \
+                    or lname.startswith("x-ratelimit"):
+                del meta["headers"][name]
+        return meta
+
+    def store(self, url, params, response):
+        meta_path, body_path = self.paths(self.key(url, params))
+        meta_bytes = json.dumps(self.response_meta(response)).encode("utf-8")
+        with self.lock:
+            self.account(meta_path, body_path)
+            self._write_atomic(body_path, response.content)
+            self._write_atomic(meta_path, meta_bytes)
+            self.total_bytes += len(response.content) + len(meta_bytes)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def store_stream(self, url, params, response, chunks):
+        """
+        Inoltra i chunk di una risposta in streaming scrivendoli su disco;
+        la voce viene registrata solo se lo stream arriva in fondo.
+        Se il consumatore si ferma prima (eccezione, limite di match) il file parziale è rimosso.
+        """
+        meta_path, body_path = self.paths(self.key(url, params))
+        tmp = f"{body_path}.{threading.get_ident()}.tmp"
+        size = 0
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+            meta_bytes = json.dumps(self.response_meta(response)).encode("utf-8")
+            with self.lock:
+                self.account(meta_path, body_path)
+                os.replace(tmp, body_path)
+                self._write_atomic(meta_path, meta_bytes)
+                self.total_bytes += size + len(meta_bytes)
+                if self.total_bytes > self.max_bytes:
+                    self.evict()
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def iter_body(self, body_path, chunk_size=64 * 1024):
+        with open(body_path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def account(self, meta_path, body_path):
+        # chiamato con il lock: toglie dal totale la voce che sta per essere sostituita
+        if self.total_bytes is None:
+            self.total_bytes = self.scan()[1]
+        self.total_bytes -= self.entry_size(meta_path, body_path)
+
+    def touch(self, url, params, meta):
+        """Risposta 304: la copia in cache torna fresca."""
+        meta_path, _ = self.paths(self.key(url, params))
+        meta["stored_at"] = time.time()
+        with self.lock:
+            self._write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+
+    def _write_atomic(self, path, data):
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    # ================= EVICTION =================
+    def entry_size(self, meta_path, body_path):
+        try:
+            return os.path.getsize(meta_path) + os.path.getsize(body_path)
+        except OSError:
+            return 0
+
+    def scan(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            meta_path = os.path.join(self.directory, name)
+            body_path = meta_path[:-5] + ".body"
+            size = self.entry_size(meta_path, body_path)
+            if not size:
+                continue
+            entries.append((os.path.getmtime(meta_path), size, meta_path, body_path))
+            total += size
+        return entries, total
+
+    def evict(self):
+        """Rimuove le voci usate meno di recente finché si rientra in max_bytes."""
+        entries, total = self.scan()
+        for _, size, meta_path, body_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+        self.total_bytes = total
+
+    def clear(self):
+        with self.lock:
+            for name in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, name))
+            self.total_bytes = 0
@@ -0,0 +1,196 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from harvest_metrics import METRICS
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe: al più `rate` richieste al secondo,
+    con raffiche fino a `capacity`.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        with self.lock:
+            self._refill()
+            return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Prende un token, attendendo se necessario. Restituisce i secondi attesi."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class HttpClient:
+    """
+    Client HTTP condiviso da tutti i fetcher.
+    - Sessione keep-alive con pool di connessioni (niente handshake TLS per pagina)
+    - Accept-Encoding gzip/deflate
+    - Limite di connessioni contemporanee per host
+    - Backoff esponenziale con jitter, rispetta Retry-After
+    - Timeout su ogni richiesta
+    - Cache su disco opzionale con rivalidazione ETag / If-Modified-Since
+    - Metriche per tentativo (latenza, byte, status, retry, backoff) in harvest_metrics
+    """
+
+    def __init__(self, timeout=(10, 30), max_retries=3, backoff_base=1, backoff_max=60,
+                 per_host_limit=4, retry_statuses=RETRY_STATUSES, retry_forbidden=True,
+                 headers=None, cache=None, source=None, metrics=METRICS):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = set(retry_statuses)
+        # False se i 403 di rate limit sono gestiti da un limiter esterno
+        self.retry_forbidden = retry_forbidden
+        # ResponseCache opzionale (http_cache): risposte su disco + rivalidazione
+        self.cache = cache
+        # etichetta delle metriche (default: host della richiesta)
+        self.source = source
+        self.metrics = metrics
+
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        if headers:
+            self.session.headers.update(headers)
+
+        # pool_block=True: oltre per_host_limit connessioni verso lo stesso host si attende
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=per_host_limit, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # ================= BACKOFF =================
+    def retry_after(self, response):
+        value = response.headers.get("Retry-After") if response is not None else None
+        if not value:
+            return None
+        if value.strip().isdigit():
+            return int(value)
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+    def backoff(self, attempt, response=None):
+        wait = self.retry_after(response)
+        if wait is not None:
+            return wait + random.uniform(0, 1)
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def is_retryable(self, response):
+        if response.status_code in self.retry_statuses:
+            return True
+        # limiti secondari (es. GitHub): 403 accompagnato da Retry-After
+        return (self.retry_forbidden and response.status_code == 403
+                and "Retry-After" in response.headers)
+
+    # ================= METRICS =================
+    def label(self, url):
+        return self.source or urlsplit(url).netloc
+
+    def response_size(self, response, stream):
+        length = response.headers.get("Content-Length")
+        if length and length.isdigit():
+            return int(length)
+        return 0 if stream else len(response.content)
+
+    # ================= GET =================
+    def get(self, url, params=None, headers=None, timeout=None, stream=False,
+            use_cache=True, before_fetch=None):
+        """
+        GET con retry (e cache, se configurata). Restituisce l'ultima risposta
+        anche se ancora in errore (il chiamante decide con raise_for_status);
+        rilancia l'ultima eccezione di rete se tutti i tentativi falliscono.
+        use_cache=False: sempre dalla rete (es. stato del rate limit, che non deve essere vecchio).
+        before_fetch: chiamata solo se la richiesta va davvero in rete (es. rate limiter),
+        non per le risposte servite dalla cache.
+        """
+        if self.cache is None or stream or not use_cache:
+            if before_fetch:
+                before_fetch()
+            return self.fetch(url, params, headers, timeout, stream)
+
+        cached = self.cache.lookup(url, params)
+        if cached is None:
+            if before_fetch:
+                before_fetch()
+            r = self.fetch(url, params, headers, timeout)
+        else:
+            meta, body_path = cached
+            if self.cache.is_fresh(url, meta):
+                self.metrics.cache_hit(self.label(url))
+                return self.cache.to_response(meta, body_path)
+            if before_fetch:
+                before_fetch()
+            conditional = dict(headers or {}, **self.cache.conditional_headers(meta))
+            r = self.fetch(url, params, conditional, timeout)
+            if r.status_code == 304:
+                self.cache.touch(url, params, meta)
+                self.metrics.cache_hit(self.label(url))
+                return self.cache.to_response(meta, body_path)
+
+        if r.status_code == 200:
+            self.cache.store(url, params, r)
+        return r
+
+    def fetch(self, url, params=None, headers=None, timeout=None, stream=False):
+        timeout = timeout or self.timeout
+        source = self.label(url)
+        for attempt in range(self.max_retries + 1):
+            last_try = attempt == self.max_retries
+            start = time.perf_counter()
+            try:
+                r = self.session.get(url, params=params, headers=headers,
+                                     timeout=timeout, stream=stream)
+            except requests.exceptions.RequestException as e:
+                self.metrics.observe_request(source, "error", time.perf_counter() - start, retry=attempt > 0)
+                if last_try:
+                    raise
+                wait = self.backoff(attempt)
+                print(f"[WARN] {url} errore: {e} – retry {wait:.1f}s")
+                self.metrics.sleep(source, wait, "backoff")
+                continue
+
+            self.metrics.observe_request(source, r.status_code, time.perf_counter() - start,
+                                         self.response_size(r, stream), retry=attempt > 0)
+            if last_try or not self.is_retryable(r):
+                return r
+
+            wait = self.backoff(attempt, r)
+            print(f"[WARN] {url} HTTP {r.status_code} – retry {wait:.1f}s")
+            r.close()
+            self.metrics.sleep(source, wait, "backoff")
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,183 @@
+import csv
+import re
+import sys
+import unicodedata
+import zlib
+
+import numpy as np
+
+csv.field_size_limit(50 * 1024 * 1024)
+
+# hash universali h(x) = (a*x + b) mod p su hash di shingle a 32 bit:
+# con a, b, x < 2^32 il prodotto resta dentro uint64
+PRIME = np.uint64(4294967311)  # primo più piccolo > 2^32
+MAX_HASH = 2 ** 32
+
+# np.trapezoid esiste da numpy 2.0; su numpy 1.x c'è solo np.trapz
+trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFKC", str(text or "")).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def shingles(text, size=4):
+    """Insieme dei k-grammi di caratteri del testo normalizzato."""
+    text = normalize_text(text)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def optimal_bands(threshold, num_perm):
+    """
+    (bande, righe per banda) che minimizzano falsi positivi + falsi negativi
+    attorno alla soglia: P(candidato | Jaccard s) = 1 - (1 - s^r)^b
+    """
+    s = np.linspace(0, 1, 201)
+    best = None
+    for b in range(1, num_perm + 1):
+        r = num_perm // b
+        p = 1 - (1 - s ** r) ** b
+        fp = trapezoid(p[s < threshold], s[s < threshold]) if threshold > 0 else 0
+        fn = trapezoid(1 - p[s >= threshold], s[s >= threshold])
+        if best is None or fp + fn < best[0]:
+            best = (fp + fn, b, r)
+    return best[1], best[2]
+
+
+class MinHashLSH:
+    """
+    Rilevamento di quasi-duplicati (sottotitoli, refusi, suffissi di versione).
+    - Firma MinHash sui k-grammi di caratteri del testo normalizzato
+    - LSH a bande: solo i record che condividono un bucket diventano coppie candidate
+    - Le candidate sono verificate con la similarità di Jaccard stimata dalle firme
+    - Cluster = componenti connesse delle coppie sopra soglia
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, shingle_size=4, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MAX_HASH, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MAX_HASH, num_perm, dtype=np.uint64)
+
+        self.signatures = []
+        self.buckets = [{} for _ in range(self.bands)]
+
+    # ================= FIRME =================
+    def signature(self, text):
+        grams = shingles(text, self.shingle_size)
+        if not grams:
+            return None
+        hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams),
+                             dtype=np.uint64, count=len(grams))
+        return ((np.outer(hashes, self.a) + self.b) % PRIME).min(axis=0)
+
+    def add(self, text):
+        """Indicizza un testo; restituisce la sua posizione (None se vuoto)."""
+        sig = self.signature(text)
+        self.signatures.append(sig)
+        if sig is None:
+            return None
+        idx = len(self.signatures) - 1
+        for band in range(self.bands):
+            key = sig[band * self.rows:(band + 1) * self.rows].tobytes()
+            self.buckets[band].setdefault(key, []).append(idx)
+        return idx
+
+    # ================= CANDIDATE =================
+    def candidate_pairs(self):
+        pairs = set()
+        for table in self.buckets:
+            for members in table.values():
+                for n, i in enumerate(members):
+                    for j in members[n + 1:]:
+                        pairs.add((i, j))
+        return pairs
+
+    def similarity(self, i, j):
+        """Jaccard stimata: frazione di componenti uguali delle due firme."""
+        return float(np.mean(self.signatures[i] == self.signatures[j]))
+
+    def similar_pairs(self):
+        for i, j in sorted(self.candidate_pairs()):
+            sim = self.similarity(i, j)
+            if sim >= self.threshold:
+                yield i, j, sim
+
+    def clusters(self):
+        """Liste di posizioni (ordinate) con almeno due record ciascuna."""
+        parent = list(range(len(self.signatures)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i, j, _ in self.similar_pairs():
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+
+        groups = {}
+        for i in range(len(parent)):
+            if self.signatures[i] is not None:
+                groups.setdefault(find(i), []).append(i)
+        return [g for g in groups.values() if len(g) > 1]
+
+
+def find_near_duplicates(records, fields=("title", "abstract"), threshold=0.8, **lsh_options):
+    """
+    Cluster di quasi-duplicati su una lista di record (dict).
+    Restituisce [[(posizione, similarità con il primo record del cluster), ...], ...].
+    """
+    lsh = MinHashLSH(threshold=threshold, **lsh_options)
+    for r in records:
+        lsh.add(" ".join(str(r.get(f) or "") for f in fields))
+
+    clusters = []
+    for group in lsh.clusters():
+        head = group[0]
+        clusters.append([(i, 1.0 if i == head else lsh.similarity(head, i)) for i in group])
+    print(f"[INFO] Quasi-duplicati: {len(clusters)} cluster, "
+          f"{sum(len(c) - 1 for c in clusters)} record da rivedere "
+          f"(soglia {threshold}, {lsh.bands} bande x {lsh.rows} righe)")
+    return clusters
+
+
+def save_clusters(path, clusters, records, columns=("title", "authors", "year", "doi", "url")):
+    """CSV da revisionare a mano: una riga per record, raggruppate per cluster."""
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(["cluster", "size", "similarity", "row", *columns])
+        for n, cluster in enumerate(clusters, 1):
+            for i, sim in cluster:
+                r = records[i]
+                writer.writerow([n, len(cluster), f"{sim:.2f}", i, *(r.get(c, "") for c in columns)])
+    print(f"[INFO] Cluster salvati in {path}")
+
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    # uso: python near_duplicates.py [file.csv] [soglia]
+    path = sys.argv[1] if len(sys.argv) > 1 else "output-zenodo/zenodo_all_years.csv"
+    threshold = float(sys.argv[2]) if len(sys.argv) > 2 else 0.8
+
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        records = list(csv.DictReader(f))
+
+    # export Zotero (Replication package) oppure CSV dei fetcher
+    if records and "Title" in records[0]:
+        fields, columns = ("Title", "Abstract Note"), ("Key", "Title", "Author", "Publication Year", "DOI")
+    else:
+        fields, columns = ("title", "abstract"), ("title", "authors", "year", "doi", "url")
+
+    clusters = find_near_duplicates(records, fields=fields, threshold=threshold)
+    save_clusters(path.rsplit(".", 1)[0] + "_near_duplicates.csv", clusters, records, columns)
@@ -0,0 +1,199 @@
+import argparse
+import importlib.util
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from harvest_metrics import METRICS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCES = ["zenodo", "scopus", "github", "lodcloud"]
+
+
+class Stage:
+    def __init__(self, name, run, deps=(), always=False):
+        """
+        run: funzione senza argomenti, il suo risultato finisce nel report
+        deps: stage da completare prima di questo
+        always: parte anche se qualche dipendenza è fallita (es. merge con i file della run precedente)
+        """
+        self.name = name
+        self.run = run
+        self.deps = list(deps)
+        self.always = always
+
+
+class Pipeline:
+    """
+    Grafo di stage eseguito su un pool di thread.
+    - Uno stage parte appena le sue dipendenze sono concluse, non quando lo sono tutte le altre
+    - Le sorgenti girano in parallelo, ciascuna con i propri rate limiter:
+      il tempo totale è quello della catena più lenta, non la somma
+    - Uno stage fallito salta i dipendenti (tranne quelli con always=True), gli altri proseguono
+    """
+
+    def __init__(self, workers=None):
+        self.stages = {}
+        self.workers = workers
+
+    def add(self, name, run, deps=(), always=False):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage {name}: dipendenza sconosciuta {dep}")
+        self.stages[name] = Stage(name, run, deps, always)
+
+    def execute(self, stage):
+        start = time.perf_counter()
+        try:
+            outcome = {"status": "ok", "result": stage.run()}
+        except Exception as e:
+            traceback.print_exc()
+            outcome = {"status": "failed", "error": repr(e)}
+        outcome["seconds"] = time.perf_counter() - start
+        METRICS.observe_stage(stage.name, outcome["seconds"], outcome["status"])
+        return outcome
+
+    def ready(self, stage, done):
+        if not all(dep in done for dep in stage.deps):
+            return False
+        return stage.always or all(done[dep]["status"] == "ok" for dep in stage.deps)
+
+    def run(self):
+        """Esegue il grafo; restituisce {stage: {"status", "seconds", "result" | "error"}}."""
+        done = {}
+        pending = dict(self.stages)
+        running = {}
+        start = time.perf_counter()
+        workers = self.workers or len(self.stages) or 1
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if self.ready(stage, done):
+                        print(f"[INFO] Stage {name}: avvio")
+                        running[pool.submit(self.execute, stage)] = name
+                        del pending[name]
+                    elif all(dep in done for dep in stage.deps):
+                        failed = [d for d in stage.deps if done[d]["status"] != "ok"]
+                        print(f"[WARN] Stage {name} saltato: dipendenze fallite {', '.join(failed)}")
+                        done[name] = {"status": "skipped", "seconds": 0.0}
+                        del pending[name]
+
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    done[name] = future.result()
+                    if done[name]["status"] == "ok":
+                        print(f"[INFO] Stage {name}: completato in {done[name]['seconds']:.1f} s")
+                    else:
+                        print(f"[WARN] Stage {name} fallito: {done[name]['error']}")
+
+        self.elapsed = time.perf_counter() - start
+        return done
+
+    def report(self, done):
+        for name in self.stages:
+            r = done[name]
+            detail = r.get("result", r.get("error", ""))
+            print(f"  {name:<16} {r['status']:<8} {r['seconds']:>8.1f} s  {detail if detail is not None else ''}")
+        serial = sum(r["seconds"] for r in done.values())
+        print(f"[INFO] Tempo totale: {self.elapsed:.1f} s (in sequenza sarebbero {serial:.1f} s)")
+
+
+# ================= STAGE =================
+def load_converter():
+    # il nome del file contiene un trattino: non importabile con import
+    if "zenodo_file_converter" in sys.modules:
+        return sys.modules["zenodo_file_converter"]
+    spec = importlib.util.spec_from_file_location(
+        "zenodo_file_converter", os.path.join(BASE_DIR, "Zenodo-FileConverter.py"))
+    module = importlib.util.module_from_spec(spec)
+    # registrato prima di eseguirlo: le sue funzioni devono essere picklabili (pool di processi)
+    sys.modules[spec.name] = module
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        del sys.modules[spec.name]
+        raise
+    return module
+
+
+def fetch_stage(source, cache):
+    if source == "zenodo":
+        import Zenodo_fetcher
+        return lambda: Zenodo_fetcher.harvest(cache=cache)
+    if source == "scopus":
+        import Scopus_fetcher
+        return lambda: Scopus_fetcher.harvest(cache=cache)
+    if source == "github":
+        import github_multifetcher_filtered
+        return lambda: github_multifetcher_filtered.harvest(cache=cache)
+    if source == "lodcloud":
+        import LodCloud_fetcher
+        return lambda: LodCloud_fetcher.harvest(cache=cache)
+    raise ValueError(f"Sorgente sconosciuta: {source}")
+
+
+def near_duplicate_report(source):
+    """Post-processing delle sorgenti senza converter dedicato: cluster di quasi-duplicati da rivedere."""
+    from harvest_state import read_csv_records
+    from near_duplicates import find_near_duplicates, save_clusters
+    from record_merge import DEFAULT_INPUTS, SOURCE_FIELDS
+
+    path = DEFAULT_INPUTS[source]
+    records = read_csv_records(path)
+    fields = SOURCE_FIELDS[source]
+    clusters = find_near_duplicates(records, fields=(fields["title"], fields["abstract"]))
+    columns = [fields[f] for f in ("title", "authors", "year", "doi", "url") if f in fields]
+    save_clusters(path.rsplit(".", 1)[0] + "_near_duplicates.csv", clusters, records, columns)
+    return len(clusters)
+
+
+def post_stage(source):
+    if source == "zenodo":
+        # niente pool di processi dentro i thread della pipeline: pulizia nel processo principale
+        return lambda: load_converter().run(parallel=False)
+    return lambda: near_duplicate_report(source)
+
+
+def build_pipeline(sources=SOURCES, merge=True, workers=None):
+    from http_cache import ResponseCache
+    from record_merge import merge_all
+
+    cache = ResponseCache(".http-cache")  # condivisa: thread-safe
+    pipeline = Pipeline(workers)
+    for source in sources:
+        pipeline.add(f"fetch:{source}", fetch_stage(source, cache))
+        pipeline.add(f"post:{source}", post_stage(source), deps=[f"fetch:{source}"])
+    if merge:
+        pipeline.add("merge", lambda: len(merge_all().records),
+                     deps=[f"post:{s}" for s in sources], always=True)
+    return pipeline
+
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Harvest parallelo di tutte le sorgenti + merge finale")
+    parser.add_argument("--sources", default=",".join(SOURCES),
+                        help=f"sorgenti separate da virgola (default: {','.join(SOURCES)})")
+    parser.add_argument("--no-merge", action="store_true", help="salta il merge tra sorgenti")
+    parser.add_argument("--workers", type=int, default=None, help="thread del pool (default: uno per stage)")
+    parser.add_argument("--metrics-dir", default="output-metrics",
+                        help="cartella del report JSON e del textfile Prometheus")
+    args = parser.parse_args()
+
+    # i fetcher scrivono in output-* relativi a Fetcher-Functions
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, BASE_DIR)
+
+    sources = [s.strip() for s in args.sources.split(",") if s.strip()]
+    pipeline = build_pipeline(sources, merge=not args.no_merge, workers=args.workers)
+    done = pipeline.run()
+    pipeline.report(done)
+    METRICS.write_json(os.path.join(args.metrics_dir, "run-report.json"))
+    METRICS.write_prometheus(os.path.join(args.metrics_dir, "harvest.prom"))
+    sys.exit(0 if all(r["status"] == "ok" for r in done.values()) else 1)
@@ -0,0 +1,90 @@
+import threading
+import time
+
+from http_client import TokenBucket
+
+
+class AdaptiveRateLimiter:
+    """
+    Rate limiter guidato dagli header della risposta (stile GitHub).
+    - X-RateLimit-Remaining / X-RateLimit-Reset: ritmo = richieste residue
+      distribuite sul tempo che manca al reset (token bucket)
+    - Remaining = 0: blocco fino al reset (epoch UTC, indipendente dal fuso locale)
+    - Limiti secondari (403/429 con Retry-After o senza header): pausa dedicata
+    - Tiene il conto del tempo passato in attesa
+    """
+
+    def __init__(self, initial_rate=0.5, max_rate=10, burst=1, secondary_wait=60, margin=1):
+        self.bucket = TokenBucket(initial_rate, capacity=burst)
+        self.max_rate = max_rate
+        self.secondary_wait = secondary_wait
+        self.margin = margin
+        self.remaining = None
+        self.reset = None
+        self.blocked_until = 0.0
+        self.waited = 0.0
+        self.lock = threading.Lock()
+
+    # ================= ACQUIRE =================
+    def acquire(self):
+        """Attende finché una richiesta è consentita. Restituisce i secondi attesi."""
+        waited = 0.0
+        delay = self.blocked_until - time.time()
+        if delay > 0:
+            print(f"[WARN] Limite API raggiunto — attendo {delay:.0f} secondi...")
+            time.sleep(delay)
+            waited += delay
+        waited += self.bucket.acquire()
+        with self.lock:
+            self.waited += waited
+        return waited
+
+    def delay(self):
+        """Stima dei secondi prima che acquire() conceda una richiesta."""
+        return max(self.blocked_until - time.time(), self.bucket.delay(), 0.0)
+
+    # ================= UPDATE =================
+    def update(self, response):
+        """
+        Aggiorna lo stato dagli header della risposta.
+        Restituisce True se la risposta è un rifiuto per rate limit (da ripetere).
+        """
+        headers = response.headers
+        now = time.time()
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+
+        with self.lock:
+            if remaining is not None and remaining.isdigit():
+                self.remaining = int(remaining)
+            if reset is not None and reset.isdigit():
+                self.reset = int(reset)
+
+            if self.remaining is not None and self.reset is not None:
+                window = max(self.reset - now, 1)
+                self.bucket.rate = min(self.max_rate, max(self.remaining, 1) / window)
+                if self.remaining == 0:
+                    self.blocked_until = max(self.blocked_until, self.reset + self.margin)
+
+            if response.status_code not in (403, 429):
+                return False
+
+            retry_after = headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                self.blocked_until = max(self.blocked_until, now + int(retry_after) + self.margin)
+                return True
+            if self.remaining == 0:
+                return True
+            if "rate limit" in response.text.lower():
+                # limite secondario senza indicazioni: pausa prudenziale
+                self.blocked_until = max(self.blocked_until, now + self.secondary_wait)
+                return True
+            return False
+
+    def report(self):
+        return {
+            "remaining": self.remaining,
+            "reset": self.reset,
+            "rate": round(self.bucket.rate, 3),
+            "waited_seconds": round(self.waited, 1),
+        }
@@ -0,0 +1,206 @@
+import csv
+import json
+import os
+import re
+import sys
+import unicodedata
+
+from export_parsers import dataset_exports, iter_export
+
+csv.field_size_limit(50 * 1024 * 1024)
+
+CANONICAL_FIELDS = ["title", "authors", "year", "abstract", "keywords", "doi", "url", "venue", "type"]
+
+# sorgente -> {campo canonico: campo del CSV / record della sorgente}
+SOURCE_FIELDS = {
+    "scopus": {"title": "title", "authors": "authors", "year": "year", "abstract": "abstract",
+               "doi": "doi", "url": "url", "venue": "source"},
+    "zenodo": {"title": "title", "authors": "authors", "year": "year", "abstract": "abstract",
+               "keywords": "keywords", "doi": "doi", "url": "url", "type": "type"},
+    "github": {"title": "title", "authors": "author", "year": "created", "abstract": "description",
+               "url": "url"},
+    "lodcloud": {"title": "title", "year": "created", "abstract": "description", "keywords": "tags",
+                 "url": "url"},
+}
+
+# record prodotti da export_parsers (export RIS / BibTeX di IEEE, ACM e Scopus)
+EXPORT_FIELDS = {f: f for f in CANONICAL_FIELDS}
+SOURCE_FIELDS["ieee"] = SOURCE_FIELDS["acm"] = EXPORT_FIELDS
+
+# tipo di default per le sorgenti che non lo riportano
+SOURCE_TYPES = {"github": "software", "lodcloud": "dataset"}
+
+# a parità di campo vince il valore della sorgente più in alto
+SOURCE_PRIORITY = ["scopus", "ieee", "acm", "zenodo", "lodcloud", "github"]
+
+# CSV dei fetcher
+DEFAULT_INPUTS = {
+    "scopus": "output-scopus/scopus_cloud.csv",
+    "zenodo": "output-zenodo/zenodo_all_years.csv",
+    "github": "output-github/github_results.csv",
+    "lodcloud": "output-lodcloud/lodcloud_results.csv",
+}
+
+DOI_PREFIX = re.compile(r"^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)", re.IGNORECASE)
+YEAR = re.compile(r"(?:19|20)\d\d")
+
+
+def normalize_doi(doi):
+    doi = DOI_PREFIX.sub("", str(doi or "").strip()).strip().lower()
+    return doi if doi.startswith("10.") else ""
+
+
+def normalize_key(text):
+    text = unicodedata.normalize("NFKC", str(text or "")).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def author_tokens(authors):
+    """Parole dei nomi (>= 3 lettere): indipendenti da "Cognome, Nome" / "Nome Cognome" / iniziali."""
+    return {t for t in normalize_key(authors).split() if len(t) >= 3 and not t.isdigit()}
+
+
+def to_canonical(source, raw, fields=None):
+    fields = fields or SOURCE_FIELDS[source]
+    record = {}
+    for field in CANONICAL_FIELDS:
+        value = raw.get(fields[field]) if field in fields else None
+        record[field] = "" if value is None else str(value).strip()
+    match = YEAR.search(record["year"])
+    record["year"] = match.group(0) if match else ""
+    record["doi"] = normalize_doi(record["doi"])
+    record["type"] = record["type"] or SOURCE_TYPES.get(source, "")
+    return record
+
+
+class RecordMerger:
+    """
+    Fusione dei record di tutte le sorgenti in un unico record canonico per opera.
+    - Join via hash sul DOI normalizzato
+    - Senza DOI in comune: blocco sul titolo normalizzato, confermato dagli autori
+      (due record con DOI diversi non vengono mai fusi)
+    - Per ogni campo vince la sorgente con priorità più alta; la provenienza è registrata
+    - Costo lineare: ogni record fa lookup su dizionari e confronta solo il proprio blocco
+    """
+
+    def __init__(self, priority=SOURCE_PRIORITY):
+        self.rank = {s: i for i, s in enumerate(priority)}
+        self.records = []
+        self.by_doi = {}
+        self.by_title = {}
+        self.matched = {"doi": 0, "title": 0}
+
+    # ================= MATCH =================
+    def match(self, record):
+        if record["doi"] and record["doi"] in self.by_doi:
+            self.matched["doi"] += 1
+            return self.by_doi[record["doi"]]
+
+        title = normalize_key(record["title"])
+        if not title:
+            return None
+        authors = author_tokens(record["authors"])
+        for idx in self.by_title.get(title, ()):
+            other = self.records[idx]
+            if record["doi"] and other["doi"] and record["doi"] != other["doi"]:
+                continue
+            other_authors = author_tokens(other["authors"])
+            if authors and other_authors and not authors & other_authors:
+                continue
+            self.matched["title"] += 1
+            return idx
+        return None
+
+    def index(self, idx):
+        record = self.records[idx]
+        if record["doi"]:
+            self.by_doi.setdefault(record["doi"], idx)
+        title = normalize_key(record["title"])
+        if title:
+            block = self.by_title.setdefault(title, [])
+            if idx not in block:
+                block.append(idx)
+
+    # ================= MERGE =================
+    def add(self, source, raw, fields=None):
+        """
+        Aggiunge un record grezzo della sorgente; restituisce l'indice del record canonico.
+        fields: mappa dei campi se diversa da SOURCE_FIELDS[source] (es. EXPORT_FIELDS)
+        """
+        record = to_canonical(source, raw, fields)
+        idx = self.match(record)
+
+        if idx is None:
+            merged = {f: record[f] for f in CANONICAL_FIELDS}
+            merged["sources"] = [source]
+            merged["provenance"] = {f: source for f in CANONICAL_FIELDS if record[f]}
+            self.records.append(merged)
+            idx = len(self.records) - 1
+        else:
+            merged = self.records[idx]
+            if source not in merged["sources"]:
+                merged["sources"].append(source)
+            rank = self.rank.get(source, len(self.rank))
+            for f in CANONICAL_FIELDS:
+                if not record[f]:
+                    continue
+                current = merged["provenance"].get(f)
+                if current is None or rank < self.rank.get(current, len(self.rank)):
+                    merged[f] = record[f]
+                    merged["provenance"][f] = source
+
+        self.index(idx)
+        return idx
+
+    def add_all(self, source, records, fields=None):
+        for raw in records:
+            self.add(source, raw, fields)
+
+    def report(self):
+        multi = sum(1 for r in self.records if len(r["sources"]) > 1)
+        print(f"[INFO] Merge: {len(self.records)} record canonici, {multi} da più sorgenti "
+              f"(join DOI: {self.matched['doi']}, titolo/autori: {self.matched['title']})")
+
+    # ================= SAVE =================
+    def save_csv(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=CANONICAL_FIELDS + ["sources", "provenance"])
+            writer.writeheader()
+            for r in self.records:
+                writer.writerow(dict(r, sources="; ".join(r["sources"]),
+                                     provenance=json.dumps(r["provenance"], sort_keys=True)))
+        print(f"[INFO] CSV salvato: {path}")
+
+
+def read_source_csv(path):
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+def merge_all(output="output-merged/biblioteca_merged.csv", inputs=DEFAULT_INPUTS):
+    """Export del replication package + CSV dei fetcher -> biblioteca unica. Restituisce il merger."""
+    merger = RecordMerger()
+    exports = dataset_exports()
+    # le sorgenti a priorità più alta per prime: i loro record aprono i canonici
+    for source in SOURCE_PRIORITY:
+        for path in exports.get(source, ()):
+            merger.add_all(source, iter_export(path), EXPORT_FIELDS)
+        path = inputs.get(source)
+        if not path:
+            continue
+        if not os.path.isfile(path):
+            print(f"[WARN] {path} non trovato, sorgente {source} saltata")
+            continue
+        merger.add_all(source, read_source_csv(path))
+
+    merger.report()
+    merger.save_csv(output)
+    return merger
+
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    # uso: python record_merge.py [output.csv]
+    merge_all(*sys.argv[1:2])
@@ -0,0 +1,192 @@
+import csv
+import json
+import os
+
+
+class RecordSink:
+    """
+    Destinazione in streaming per i record dei fetcher.
+    - I record vengono scritti appena arrivano, pagina per pagina
+    - flush + fsync ogni `flush_every` record: quanto scaricato è già su disco
+    - Si scrive su `path`.part; close() lo rinomina atomicamente su `path`,
+      abort() lo scarta e l'eventuale file precedente resta intatto
+    - Il file viene creato al primo record: senza record non si scrive nulla
+      (a meno di keep_empty=True)
+    - Context manager: un'eccezione nel blocco equivale ad abort()
+    """
+
+    encoding = "utf-8"
+    newline = None
+
+    def __init__(self, path, flush_every=100, keep_empty=False):
+        self.path = path
+        self.tmp = path + ".part"
+        self.flush_every = flush_every
+        self.keep_empty = keep_empty
+        self.count = 0
+        self.file = None
+
+    # ================= FILE =================
+    def open(self, first=None):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.file = open(self.tmp, "w", newline=self.newline, encoding=self.encoding)
+        self.start(first)
+
+    def start(self, first):
+        """Intestazione del file (first = primo record, None se vuoto)."""
+
+    def write_record(self, record):
+        raise NotImplementedError
+
+    # ================= WRITE =================
+    def write(self, record):
+        if self.file is None:
+            self.open(record)
+        self.count += 1
+        self.write_record(record)
+        if self.count % self.flush_every == 0:
+            self.flush()
+
+    def write_all(self, records):
+        """Scrive un iterabile di record (anche un generatore); restituisce quanti."""
+        n = 0
+        for record in records:
+            self.write(record)
+            n += 1
+        self.flush()
+        return n
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    # ================= FINALIZE =================
+    def close(self):
+        """Rende definitivo il file; restituisce False se non c'era nulla da scrivere."""
+        if self.file is None:
+            if not self.keep_empty:
+                return False
+            self.open()
+        self.flush()
+        self.file.close()
+        self.file = None
+        os.replace(self.tmp, self.path)
+        return True
+
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if os.path.exists(self.tmp):
+            os.remove(self.tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class CsvSink(RecordSink):
+    """CSV (utf-8-sig); senza fieldnames l'intestazione sono le chiavi del primo record."""
+
+    encoding = "utf-8-sig"
+    newline = ""
+
+    def __init__(self, path, fieldnames=None, row=None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.fieldnames = fieldnames
+        self.row = row  # eventuale trasformazione record -> riga
+        self.writer = None
+
+    def start(self, first):
+        if self.fieldnames is None:
+            first = self.row(first) if first is not None and self.row else first
+            self.fieldnames = list(first.keys()) if first is not None else []
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames)
+        self.writer.writeheader()
+
+    def write_record(self, record):
+        self.writer.writerow(self.row(record) if self.row else record)
+
+
+class BibtexSink(RecordSink):
+    """BibTeX: entry(record, n) restituisce il testo della voce n-esima (da 1)."""
+
+    def __init__(self, path, entry, **kwargs):
+        super().__init__(path, **kwargs)
+        self.entry = entry
+
+    def write_record(self, record):
+        self.file.write(self.entry(record, self.count))
+
+
+class JsonlSink(RecordSink):
+    """Un record JSON per riga."""
+
+    def write_record(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+class TeeSink:
+    """Inoltra ogni record a più sink (es. CSV + BibTeX dello stesso harvest)."""
+
+    def __init__(self, *sinks):
+        self.sinks = list(sinks)
+        self.count = 0
+
+    def write(self, record):
+        self.count += 1
+        for sink in self.sinks:
+            sink.write(record)
+
+    def write_all(self, records):
+        n = 0
+        for record in records:
+            self.write(record)
+            n += 1
+        self.flush()
+        return n
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        return any([sink.close() for sink in self.sinks])
+
+    def abort(self):
+        for sink in self.sinks:
+            sink.abort()
+
+    __enter__ = RecordSink.__enter__
+    __exit__ = RecordSink.__exit__
+
+
+class PartitionSink(TeeSink):
+    """
+    Smista i record su un sink per partizione (es. un file per anno):
+    key(record) -> partizione, factory(partizione) -> sink, aperto al primo record.
+    """
+
+    def __init__(self, key, factory):
+        super().__init__()
+        self.key = key
+        self.factory = factory
+        self.partitions = {}
+
+    def write(self, record):
+        part = self.key(record)
+        if part not in self.partitions:
+            self.partitions[part] = self.factory(part)
+            self.sinks.append(self.partitions[part])
+        self.count += 1
+        self.partitions[part].write(record)
+
+    def counts(self):
+        return {part: sink.count for part, sink in self.partitions.items()}
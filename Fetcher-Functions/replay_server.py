@@ -0,0 +1,441 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from http_client import HttpClient
+
+# host reali delle API -> prefisso sul server locale
+UPSTREAMS = {
+    "zenodo": "https://zenodo.org",
+    "scopus": "https://api.elsevier.com",
+    "github": "https://api.github.com",
+    "lodcloud": "https://lod-cloud.net",
+}
+
+CHUNK_SIZE = 64 * 1024
+FIRST_DAY = date(2014, 1, 2)
+LAST_DAY = date(2026, 12, 31)
+
+RE_ZENODO_CREATED = re.compile(r"created:\[(\d{4}-\d\d-\d\d) TO (\d{4}-\d\d-\d\d)\}")
+RE_GITHUB_CREATED = re.compile(r"created:(\d{4}-\d\d-\d\d)\.\.(\d{4}-\d\d-\d\d)")
+
+
+def cassette_key(source, path, params):
+    """Chiave di una risposta registrata: sorgente, path e parametri ordinati."""
+    pairs = sorted((str(k), str(v)) for k, v in (params.items() if isinstance(params, dict) else params))
+    return f"{source} {path}?{urlencode(pairs)}"
+
+
+def split_upstream(url):
+    """URL reale -> (sorgente, path); (None, None) se non è un'API nota."""
+    for source, base in UPSTREAMS.items():
+        if url.startswith(base):
+            return source, urlsplit(url).path
+    return None, None
+
+
+# ================= SCENARIO =================
+class Scenario:
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit=None, window=1.0, retry_after=1,
+                 error_every=0, error_status=503, seed=1):
+        """
+        latency / jitter: secondi di attesa prima di ogni risposta (jitter uniforme ±)
+        rate_limit: richieste consentite per sorgente ogni `window` secondi (None = nessun limite);
+        oltre: 429 + Retry-After (Zenodo, Scopus, LOD) o 403 + X-RateLimit-Remaining: 0 (GitHub)
+        error_every: una richiesta ogni N risponde error_status (0 = mai)
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.window = window
+        self.retry_after = retry_after
+        self.error_every = error_every
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+
+    def delay(self):
+        if not self.latency and not self.jitter:
+            return 0.0
+        return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+
+
+SCENARIOS = {
+    "clean": Scenario(latency=0.01),
+    "slow": Scenario(latency=0.2, jitter=0.05),
+    "rate-limited": Scenario(latency=0.01, rate_limit=3, window=2.0, retry_after=2),
+    "flaky": Scenario(latency=0.01, error_every=4),
+}
+
+
+# ================= SYNTHETIC CORPUS =================
+class SyntheticCorpus:
+    """
+    Record deterministici nel formato di ciascuna API, generati dall'indice.
+    - Date di creazione distribuite su 2014-2026 (servono allo slicing / sharding per data)
+    - Un record Zenodo ogni `duplicate_every` ripete il DOI del precedente (dedup dei fetcher)
+    - Metà dei dataset LOD contiene i termini della query (filtro del fetcher)
+    """
+
+    TOPICS = ["cloud computing ontology", "multi-cloud knowledge graph", "semantic web services",
+              "linked open data for cloud brokers", "ontology-based cloud SLA"]
+
+    def __init__(self, records=None, duplicate_every=20):
+        self.sizes = {"zenodo": 500, "scopus": 250, "github": 300, "lodcloud": 2000}
+        if records:
+            self.sizes.update(records)
+        self.duplicate_every = duplicate_every
+        self.span = (LAST_DAY - FIRST_DAY).days
+        self.dates = {s: [self.created(i) for i in range(n)] for s, n in self.sizes.items()}
+
+    def created(self, i):
+        return FIRST_DAY + timedelta(days=(i * 7919) % (self.span + 1))
+
+    def title(self, i):
+        return f"{self.TOPICS[i % len(self.TOPICS)].title()} {i}"
+
+    def select(self, source, start=None, end=None, inclusive_end=False):
+        """Indici dei record con data in [start, end) (o [start, end] se inclusive_end)."""
+        dates = self.dates[source]
+        if start is None:
+            return list(range(len(dates)))
+        if inclusive_end:
+            return [i for i, d in enumerate(dates) if start <= d <= end]
+        return [i for i, d in enumerate(dates) if start <= d < end]
+
+    # ----------------- formati delle API -----------------
+    def zenodo_hit(self, i):
+        doi_index = i - 1 if self.duplicate_every and i % self.duplicate_every == 1 and i > 0 else i
+        created = self.dates["zenodo"][i]
+        return {
+            "id": i,
+            "created": f"{created.isoformat()}T10:00:00+00:00",
+            "links": {"html": f"https://zenodo.org/records/{doi_index}"},
+            "metadata": {
+                "title": self.title(i),
+                "doi": f"10.5281/zenodo.{doi_index}",
+                "creators": [{"name": f"Rossi, Maria {i % 13}"}, {"name": f"Bianchi, Luca {i % 7}"}],
+                "description": f"<p>Synthetic record {i} about {self.TOPICS[i % len(self.TOPICS)]}.</p>",
+                "keywords": ["cloud computing", "ontology"],
+                "resource_type": {"type": "dataset" if i % 3 else "publication"},
+            },
+        }
+
+    def scopus_entry(self, i):
+        created = self.dates["scopus"][i]
+        return {
+            "dc:identifier": f"SCOPUS_ID:{85000000000 + i}",
+            "eid": f"2-s2.0-{85000000000 + i}",
+            "dc:title": self.title(i),
+            "dc:description": f"Synthetic abstract {i}.",
+            "dc:creator": f"Rossi M.{i % 13}",
+            "prism:doi": f"10.1016/j.synth.{i}",
+            "prism:coverDate": created.isoformat(),
+            "prism:publicationName": "Journal of Synthetic Clouds",
+            "citedby-count": str(i % 50),
+            "link": [{"@href": f"https://api.elsevier.com/content/abstract/scopus_id/{85000000000 + i}"}],
+        }
+
+    def github_item(self, i):
+        created = self.dates["github"][i]
+        return {
+            "name": f"cloud-ontology-{i}",
+            "owner": {"login": f"user{i % 17}"},
+            "description": self.title(i),
+            "created_at": f"{created.isoformat()}T12:00:00Z",
+            "updated_at": f"{created.isoformat()}T12:00:00Z",
+            "language": "Python",
+            "stargazers_count": i % 100,
+            "html_url": f"https://github.com/user{i % 17}/cloud-ontology-{i}",
+            "license": {"name": "MIT License"} if i % 2 else None,
+        }
+
+    def lod_entry(self, i):
+        topic = self.TOPICS[i % len(self.TOPICS)] if i % 2 == 0 else "biodiversity occurrence records"
+        return {
+            "title": f"Dataset {i}: {topic}",
+            "description": {"en": f"Synthetic LOD dataset {i} on {topic}."},
+            "keywords": ["rdf", "linked data"],
+            "issued": str(2010 + i % 17),
+        }
+
+    def lod_catalog(self):
+        return {f"dataset-{i}": self.lod_entry(i) for i in range(self.sizes["lodcloud"])}
+
+
+# ================= SERVER =================
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):  # niente log per richiesta
+        pass
+
+    def do_GET(self):
+        self.server.replay.handle(self)
+
+
+class ReplayServer:
+    """
+    Server HTTP locale al posto delle API di Zenodo, Scopus, GitHub e LOD Cloud.
+    - Path: /<sorgente>/<path dell'API reale> (es. /zenodo/api/records?q=...)
+    - Risposte da cassette registrate (JSONL) oppure generate da SyntheticCorpus,
+      con la paginazione delle API reali (page/size, start/count, page/per_page + tetto 1000)
+    - Scenario: latenza, rate limit (429 / 403 + header), errori 5xx
+    - Statistiche per sorgente: richieste, rifiutate, errori, byte
+    """
+
+    def __init__(self, scenario=None, corpus=None, cassette=None, synthetic=True,
+                 host="127.0.0.1", port=0):
+        self.scenario = scenario or Scenario()
+        self.corpus = corpus or SyntheticCorpus()
+        self.synthetic = synthetic
+        self.recorded = load_cassette(cassette) if cassette else {}
+        self.lock = threading.Lock()
+        self.windows = {s: deque() for s in UPSTREAMS}
+        self.counters = {s: 0 for s in UPSTREAMS}
+        self.stats = {s: {"requests": 0, "throttled": 0, "errors": 0, "bytes": 0} for s in UPSTREAMS}
+        self.catalog = None
+        self.httpd = ThreadingHTTPServer((host, port), ReplayHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.replay = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def reset_stats(self):
+        with self.lock:
+            for s in self.stats:
+                self.stats[s] = {"requests": 0, "throttled": 0, "errors": 0, "bytes": 0}
+                self.windows[s].clear()
+                self.counters[s] = 0
+
+    # ================= FAULTS =================
+    def admit(self, source):
+        """None se la richiesta passa, altrimenti (status, header, corpo) del rifiuto."""
+        sc = self.scenario
+        with self.lock:
+            self.stats[source]["requests"] += 1
+            self.counters[source] += 1
+            n = self.counters[source]
+            if sc.error_every and n % sc.error_every == 0:
+                self.stats[source]["errors"] += 1
+                return sc.error_status, {}, {"message": "Simulated server error"}
+
+            if sc.rate_limit is None:
+                return None
+            now = time.time()
+            window = self.windows[source]
+            while window and window[0] <= now - sc.window:
+                window.popleft()
+            if len(window) < sc.rate_limit:
+                window.append(now)
+                return None
+            self.stats[source]["throttled"] += 1
+            if source == "github":
+                reset = int(window[0] + sc.window) + 1
+                return 403, {"X-RateLimit-Limit": str(sc.rate_limit), "X-RateLimit-Remaining": "0",
+                             "X-RateLimit-Reset": str(reset)}, {"message": "API rate limit exceeded"}
+            return 429, {"Retry-After": str(sc.retry_after)}, {"message": "Too Many Requests"}
+
+    def quota_headers(self, source):
+        """X-RateLimit-* sulle risposte GitHub riuscite (guidano AdaptiveRateLimiter)."""
+        if source != "github":
+            return {}
+        sc = self.scenario
+        if sc.rate_limit is None:
+            return {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "4999",
+                    "X-RateLimit-Reset": str(int(time.time()) + 3600)}
+        with self.lock:
+            window = self.windows[source]
+            remaining = max(sc.rate_limit - len(window), 0)
+            reset = int((window[0] if window else time.time()) + sc.window) + 1
+        return {"X-RateLimit-Limit": str(sc.rate_limit), "X-RateLimit-Remaining": str(remaining),
+                "X-RateLimit-Reset": str(reset)}
+
+    # ================= DISPATCH =================
+    def handle(self, request):
+        parts = urlsplit(request.path)
+        source, _, path = parts.path.lstrip("/").partition("/")
+        path = "/" + path
+        if source not in UPSTREAMS:
+            return self.send(request, source, 404, {}, {"message": f"Sorgente sconosciuta: {source}"})
+        params = dict(parse_qsl(parts.query, keep_blank_values=True))
+
+        delay = self.scenario.delay()
+        if delay:
+            time.sleep(delay)
+        refused = self.admit(source)
+        if refused:
+            return self.send(request, source, *refused)
+
+        key = cassette_key(source, path, params)
+        if key in self.recorded:
+            entry = self.recorded[key]
+            return self.send(request, source, entry["status"], entry.get("headers", {}),
+                             entry["body"].encode("utf-8"))
+        if not self.synthetic:
+            return self.send(request, source, 404, {}, {"message": f"Risposta non registrata: {key}"})
+
+        handler = getattr(self, f"serve_{source}")
+        status, body = handler(path, params)
+        return self.send(request, source, status, self.quota_headers(source), body)
+
+    def send(self, request, source, status, headers, body):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            if name.lower() not in ("content-length", "content-encoding", "transfer-encoding", "connection"):
+                request.send_header(name, value)
+        request.end_headers()
+        # il corpo viene scritto a blocchi, come un download in streaming
+        for i in range(0, len(body), CHUNK_SIZE):
+            request.wfile.write(body[i:i + CHUNK_SIZE])
+        with self.lock:
+            self.stats[source]["bytes"] += len(body)
+
+    # ================= API SINTETICHE =================
+    def serve_zenodo(self, path, params):
+        page, size = int(params.get("page", 1)), int(params.get("size", 10))
+        if page * size > 10000:
+            return 400, {"message": "Pagination beyond 10000 results is not supported"}
+        m = RE_ZENODO_CREATED.search(params.get("q", ""))
+        if m:
+            selected = self.corpus.select("zenodo", date.fromisoformat(m.group(1)),
+                                          date.fromisoformat(m.group(2)))
+        else:
+            selected = self.corpus.select("zenodo")
+        window = selected[(page - 1) * size:page * size]
+        return 200, {"hits": {"hits": [self.corpus.zenodo_hit(i) for i in window],
+                              "total": len(selected)}}
+
+    def serve_scopus(self, path, params):
+        start, count = int(params.get("start", 0)), int(params.get("count", 25))
+        selected = self.corpus.select("scopus")
+        window = selected[start:start + count]
+        return 200, {"search-results": {"opensearch:totalResults": str(len(selected)),
+                                        "opensearch:startIndex": str(start),
+                                        "entry": [self.corpus.scopus_entry(i) for i in window]}}
+
+    def serve_github(self, path, params):
+        if path == "/rate_limit":
+            return 200, {"resources": {"search": {"limit": 30, "remaining": 30}}}
+        page, per_page = int(params.get("page", 1)), int(params.get("per_page", 30))
+        if (page - 1) * per_page >= 1000:
+            return 422, {"message": "Only the first 1000 search results are available"}
+        m = RE_GITHUB_CREATED.search(params.get("q", ""))
+        if m:
+            selected = self.corpus.select("github", date.fromisoformat(m.group(1)),
+                                          date.fromisoformat(m.group(2)), inclusive_end=True)
+        else:
+            selected = self.corpus.select("github")
+        window = selected[(page - 1) * per_page:page * per_page]
+        return 200, {"total_count": len(selected), "incomplete_results": False,
+                     "items": [self.corpus.github_item(i) for i in window]}
+
+    def serve_lodcloud(self, path, params):
+        if self.catalog is None:
+            self.catalog = json.dumps(self.corpus.lod_catalog()).encode("utf-8")
+        return 200, self.catalog
+
+
+# ================= CASSETTE =================
+def load_cassette(path):
+    recorded = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                recorded[entry["key"]] = entry
+    print(f"[INFO] Cassette {path}: {len(recorded)} risposte registrate")
+    return recorded
+
+
+class ReplayClient(HttpClient):
+    """HttpClient che manda le richieste alle API reali sul ReplayServer locale."""
+
+    def __init__(self, server_url, **kwargs):
+        super().__init__(**kwargs)
+        self.server_url = server_url.rstrip("/")
+
+    def redirect(self, url):
+        source, _ = split_upstream(url)
+        if source is None:
+            return url
+        return self.server_url + "/" + source + url[len(UPSTREAMS[source]):]
+
+    def fetch(self, url, params=None, headers=None, timeout=None, stream=False):
+        return super().fetch(self.redirect(url), params, headers, timeout, stream)
+
+
+class RecordingClient(HttpClient):
+    """HttpClient verso le API reali che salva ogni risposta definitiva in una cassette JSONL."""
+
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.write_lock = threading.Lock()
+
+    def fetch(self, url, params=None, headers=None, timeout=None, stream=False):
+        r = super().fetch(url, params, headers, timeout, stream)
+        source, path = split_upstream(url)
+        if source is not None:
+            entry = {
+                "key": cassette_key(source, path, params or {}),
+                "status": r.status_code,
+                "headers": {k: v for k, v in r.headers.items()
+                            if k.lower().startswith(("x-ratelimit", "retry-after", "etag", "last-modified"))},
+                "body": r.content.decode("utf-8", errors="replace"),
+                "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+            with self.write_lock, open(self.cassette, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return r
+
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    # server in primo piano per prove manuali: python replay_server.py --scenario flaky
+    parser = argparse.ArgumentParser(description="Server locale che simula le API dei fetcher")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="clean")
+    parser.add_argument("--cassette", help="risposte registrate (JSONL) da servire")
+    parser.add_argument("--no-synthetic", action="store_true", help="solo risposte registrate")
+    args = parser.parse_args()
+
+    server = ReplayServer(SCENARIOS[args.scenario], cassette=args.cassette,
+                          synthetic=not args.no_synthetic, port=args.port)
+    print(f"[INFO] Replay server su {server.url} (scenario {args.scenario})")
+    for source, base in UPSTREAMS.items():
+        print(f"  {base} -> {server.url}/{source}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
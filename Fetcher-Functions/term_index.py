@@ -0,0 +1,247 @@
+import bisect
+import csv
+import gzip
+import json
+import os
+import re
+import sys
+import time
+
+from term_matcher import term_pattern
+
+csv.field_size_limit(50 * 1024 * 1024)
+
+# sorgente -> (CSV, campi testuali, campi identificativi in ordine di preferenza)
+DEFAULT_SOURCES = {
+    "zenodo": ("output-zenodo/zenodo_all_years.csv", ["title", "abstract", "keywords"], ["doi", "url"]),
+    "scopus": ("output-scopus/scopus_cloud.csv", ["title", "abstract"], ["eid", "doi", "url"]),
+    "github": ("output-github/github_results.csv", ["title", "description"], ["url"]),
+    "lodcloud": ("output-lodcloud/lodcloud_results.csv", ["title", "description", "tags"], ["url"]),
+}
+
+TOKEN_RE = re.compile(r'"[^"]*"|\(|\)|[^\s()"]+')
+
+
+class TermIndex:
+    """
+    Indice locale di incidenza termini su tutti i record raccolti.
+    - Posting per token \\w+ come bitset (int Python, un bit per record)
+    - Wildcard: OR dei bitset del vocabolario ordinato con quel prefisso
+    - Frasi / sottostringhe: candidati dai token, verifica sul testo, risultato memorizzato
+    - Query booleane AND / OR / NOT con parentesi (stessa semantica dei termini di TermMatcher)
+    - Conteggi e ID dei record per sorgente
+    """
+
+    def __init__(self):
+        self.texts = []
+        self.sources = []
+        self.ids = []
+        self.postings = {}
+        self.vocab = []
+        self.cache = {}
+
+    # ================= BUILD =================
+    def add(self, source, record_id, text):
+        bit = 1 << len(self.texts)
+        text = text.lower()
+        self.texts.append(text)
+        self.sources.append(source)
+        self.ids.append(record_id)
+        for token in set(re.findall(r"\w+", text)):
+            self.postings[token] = self.postings.get(token, 0) | bit
+
+    def finalize(self):
+        self.vocab = sorted(self.postings)
+        self.cache = {}
+        return self
+
+    @classmethod
+    def build(cls, sources=None):
+        index = cls()
+        for source, (path, text_fields, id_fields) in (sources or DEFAULT_SOURCES).items():
+            if not os.path.isfile(path):
+                print(f"[WARN] {path} non trovato, sorgente {source} saltata")
+                continue
+            with open(path, "r", newline="", encoding="utf-8-sig") as f:
+                for i, row in enumerate(csv.DictReader(f)):
+                    record_id = next((row[k] for k in id_fields if row.get(k)), f"{source}:{i}")
+                    index.add(source, record_id, " ".join(row.get(k) or "" for k in text_fields))
+        print(f"[INFO] Indice: {len(index.texts)} record, {len(index.postings)} token")
+        return index.finalize()
+
+    @property
+    def all_bits(self):
+        return (1 << len(self.texts)) - 1
+
+    # ================= PERSISTENZA =================
+    def save(self, path):
+        data = {"texts": self.texts, "sources": self.sources, "ids": self.ids,
+                "postings": {t: format(b, "x") for t, b in self.postings.items()}}
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls()
+        index.texts, index.sources, index.ids = data["texts"], data["sources"], data["ids"]
+        index.postings = {t: int(b, 16) for t, b in data["postings"].items()}
+        return index.finalize()
+
+    # ================= TERMINI =================
+    def prefix_bits(self, prefix):
+        bits = 0
+        i = bisect.bisect_left(self.vocab, prefix)
+        while i < len(self.vocab) and self.vocab[i].startswith(prefix):
+            bits |= self.postings[self.vocab[i]]
+            i += 1
+        return bits
+
+    def containing_bits(self, piece):
+        bits = 0
+        for token, b in self.postings.items():
+            if piece in token:
+                bits |= b
+        return bits
+
+    def term_bits(self, term):
+        term = term.lower()
+        if term in self.cache:
+            return self.cache[term]
+
+        pattern = term_pattern(term)
+        if pattern is None:
+            bits = 0
+        elif term.endswith("*"):
+            bits = self.prefix_bits(term[:-1]) if term[:-1] else self.any_token_bits()
+        else:
+            # ogni pezzo \w+ del termine compare dentro un token del record: candidati
+            candidates = self.all_bits
+            for piece in re.findall(r"\w+", term):
+                candidates &= self.containing_bits(piece)
+            bits = 0
+            while candidates:
+                low = candidates & -candidates
+                i = low.bit_length() - 1
+                if term in self.texts[i]:
+                    bits |= low
+                candidates ^= low
+        self.cache[term] = bits
+        return bits
+
+    def any_token_bits(self):
+        bits = 0
+        for b in self.postings.values():
+            bits |= b
+        return bits
+
+    # ================= QUERY =================
+    def parse(self, query):
+        tokens = TOKEN_RE.findall(query)
+        pos = 0
+
+        def peek():
+            return tokens[pos] if pos < len(tokens) else None
+
+        def take():
+            nonlocal pos
+            pos += 1
+            return tokens[pos - 1]
+
+        def parse_or():
+            node = parse_and()
+            while peek() == "OR":
+                take()
+                node = ("or", node, parse_and())
+            return node
+
+        def parse_and():
+            node = parse_not()
+            while peek() not in (None, "OR", ")"):
+                if peek() == "AND":
+                    take()
+                node = ("and", node, parse_not())
+            return node
+
+        def parse_not():
+            if peek() == "NOT":
+                take()
+                return ("not", parse_not())
+            return parse_atom()
+
+        def parse_atom():
+            tok = take() if peek() is not None else None
+            if tok == "(":
+                node = parse_or()
+                if peek() != ")":
+                    raise ValueError(f"Parentesi non bilanciate in: {query}")
+                take()
+                return node
+            if tok is None or tok in ("AND", "OR", "NOT", ")"):
+                raise ValueError(f"Query non valida: {query}")
+            return ("term", tok.strip('"'))
+
+        node = parse_or()
+        if pos != len(tokens):
+            raise ValueError(f"Query non valida: {query}")
+        return node
+
+    def evaluate(self, node):
+        kind = node[0]
+        if kind == "term":
+            return self.term_bits(node[1])
+        if kind == "not":
+            return self.all_bits & ~self.evaluate(node[1])
+        left, right = self.evaluate(node[1]), self.evaluate(node[2])
+        return left & right if kind == "and" else left | right
+
+    def search(self, query):
+        """Restituisce {sorgente: {"count": n, "ids": [...]}} per una stringa booleana."""
+        bits = self.evaluate(self.parse(query))
+        report = {}
+        while bits:
+            low = bits & -bits
+            i = low.bit_length() - 1
+            entry = report.setdefault(self.sources[i], {"count": 0, "ids": []})
+            entry["count"] += 1
+            entry["ids"].append(self.ids[i])
+            bits ^= low
+        return report
+
+
+def build_query(cloud_terms, semantic_terms, exclude_terms):
+    """Stringa booleana equivalente al filtro cloud AND semantic AND NOT exclude."""
+    def group(terms):
+        return "(" + " OR ".join(f'"{t}"' for t in terms) + ")"
+    return f"{group(cloud_terms)} AND {group(semantic_terms)} AND NOT {group(exclude_terms)}"
+
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    INDEX_PATH = "term-index.json.gz"
+
+    args = [a for a in sys.argv[1:] if a != "--rebuild"]
+    if os.path.isfile(INDEX_PATH) and "--rebuild" not in sys.argv:
+        index = TermIndex.load(INDEX_PATH)
+    else:
+        index = TermIndex.build()
+        index.save(INDEX_PATH)
+
+    cloud_terms = ["cloud computing", "cloud-computing", "multi-cloud"]
+    semantic_terms = ["ontolog*", "semantic web", "knowledge graph*", "linked data", "linked open data"]
+    exclude_terms = ["internet of things", "iot"]
+
+    variants = [
+        build_query(cloud_terms, semantic_terms, exclude_terms),
+        build_query(cloud_terms, semantic_terms + ["knowledge graph"], exclude_terms),
+        build_query(cloud_terms + ["cloud"], semantic_terms, exclude_terms),
+        build_query(cloud_terms, semantic_terms, ["internet of things"]),
+    ] + args  # stringhe aggiuntive da riga di comando
+
+    for q in variants:
+        t = time.perf_counter()
+        report = index.search(q)
+        ms = (time.perf_counter() - t) * 1000
+        counts = ", ".join(f"{s}: {r['count']}" for s, r in sorted(report.items()))
+        print(f"[INFO] {ms:.1f} ms | {counts or 'nessun record'} | {q}")
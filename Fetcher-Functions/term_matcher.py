@@ -0,0 +1,68 @@
+import re
+
+
+def term_pattern(term):
+    """
+    Regex equivalente alla semantica storica dei termini (testo già in minuscolo):
+    - termine semplice: sottostringa ("iot" trova anche "patriotic")
+    - termine con * finale: una parola \\w+ che inizia con il prefisso;
+      un prefisso con caratteri non-\\w (es. "knowledge graph*") non trova mai nulla
+    """
+    term = term.lower()
+    if not term.endswith("*"):
+        return re.escape(term)
+    prefix = term[:-1]
+    if not re.fullmatch(r"\w*", prefix):
+        return None
+    # inizio di parola: nessun carattere \w subito prima
+    return r"(?<!\w)" + (re.escape(prefix) if prefix else r"\w")
+
+
+class TermMatcher:
+    """
+    Matcher compilato per filtri TITLE–ABS–KEY.
+    - all_of: gruppi di termini in AND (almeno un termine per gruppo, OR interno)
+    - none_of: termini in NOT
+    - Tutti i termini in un'unica regex: una sola passata sul testo
+    - Stessi risultati del confronto termine per termine, wildcard comprese
+    """
+
+    def __init__(self, all_of=(), none_of=()):
+        self.all_of = [list(g) for g in all_of]
+        self.none_of = list(none_of)
+
+        # (gruppo, pattern) per ogni termine; gruppo -1 = esclusioni
+        entries = [(i, term_pattern(t)) for i, g in enumerate(self.all_of) for t in g]
+        entries += [(-1, term_pattern(t)) for t in self.none_of]
+        entries = [(g, p) for g, p in entries if p is not None]
+
+        self.group_of = [g for g, _ in entries]
+        if entries:
+            # il primo lookahead seleziona le posizioni dove inizia un termine,
+            # i successivi registrano tutti i termini che iniziano lì
+            any_term = "|".join(p for _, p in entries)
+            captures = "".join(f"(?:(?=({p})))?" for _, p in entries)
+            self.regex = re.compile(f"(?=(?:{any_term})){captures}")
+        else:
+            self.regex = None
+
+    def groups_found(self, text):
+        """Indici dei gruppi all_of presenti nel testo (-1 se compare un'esclusione)."""
+        found = set()
+        if self.regex is None:
+            return found
+        for m in self.regex.finditer(text):
+            for idx, value in enumerate(m.groups()):
+                if value is not None:
+                    found.add(self.group_of[idx])
+            if -1 in found:
+                break
+        return found
+
+    def matches(self, text):
+        found = self.groups_found(text)
+        if -1 in found:
+            return False
+        return all(i in found for i in range(len(self.all_of)))
+
+    __call__ = matches
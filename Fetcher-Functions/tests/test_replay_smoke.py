@@ -0,0 +1,35 @@
+"""
+Smoke test di regressione: ogni fetcher contro il ReplayServer locale, senza rete né token.
+Il corpus sintetico è deterministico, quindi i record attesi sono fissi.
+"""
+import pytest
+
+from benchmark_fetchers import RUNNERS, bench_source
+from replay_server import SCENARIOS, ReplayServer, SyntheticCorpus
+
+# record unici prodotti dai runner di benchmark_fetchers sul corpus sintetico di default
+EXPECTED_RECORDS = {"zenodo": 450, "scopus": 250, "github": 300, "lodcloud": 306}
+
+
+@pytest.fixture(scope="module", params=["clean", "flaky"])
+def server(request):
+    with ReplayServer(SCENARIOS[request.param], corpus=SyntheticCorpus()) as srv:
+        yield srv
+
+
+@pytest.mark.parametrize("source", sorted(RUNNERS))
+def test_record_counts(server, source):
+    # anche con 503 intermittenti (flaky) i retry devono restituire tutti i record
+    result = bench_source(server, source)
+    assert result["records"] == EXPECTED_RECORDS[source]
+    assert result["requests"] > 0
+    # attesa del thread più bloccato: non può superare la durata della run
+    assert result["wait_s"] <= result["seconds"]
+
+
+def test_server_latency_is_not_client_wait():
+    # la latenza simulata dal server non deve finire tra le attese del fetcher
+    with ReplayServer(SCENARIOS["slow"], corpus=SyntheticCorpus()) as srv:
+        result = bench_source(srv, "lodcloud")
+    assert result["records"] == EXPECTED_RECORDS["lodcloud"]
+    assert result["wait_s"] == 0